@@ -6,6 +6,7 @@ import time
 import py_trees
 
 from okon_client import Okon
+from okon_depth import DepthMap
 
 
 class Status:
@@ -15,26 +16,60 @@ class Status:
     INVALID = py_trees.common.Status.INVALID
 
 
-class SetDepth(py_trees.behaviour.Behaviour):
+class OkonBehaviour(py_trees.behaviour.Behaviour):
+    """Behaviour formatting its feedback and debug messages only when they are used.
+
+    set_feedback(template, *args) keeps a str.format template with its arguments,
+    they are formatted when feedback_message is read (tree display, okon_profiler traces).
+    """
+
+    @property
+    def feedback_message(self) -> str:
+        feedback = self._feedback
+        if type(feedback) is tuple:
+            feedback = self._feedback = feedback[0].format(*feedback[1:])
+        return feedback
+
+    @feedback_message.setter
+    def feedback_message(self, message: str) -> None:
+        self._feedback = message
+
+    def set_feedback(self, template: str, *args) -> None:
+        self._feedback = (template, *args)
+
+    def log_call(self, method: str, new_status: py_trees.common.Status = None) -> None:
+        """Logs a call of method with the status change (and feedback of update) if debug logging is on"""
+        if py_trees.logging.level > py_trees.logging.Level.DEBUG:
+            return
+        message = f"{self.__class__.__name__}.{method}()"
+        if new_status is not None:
+            message += f"[{self.status}->{new_status}]"
+        if method == "update":
+            message += f"[{self.feedback_message}]"
+        self.logger.debug(message)
+
+
+class SetDepth(OkonBehaviour):
     def __init__(self, name: str = "set depth", okon: Okon = None, depth: float = 0.6, delta: float = 0.05):
         super().__init__(name)
         self.okon = okon
         self.depth = depth
         self.delta = delta
-        self.logger.debug(f"{self.__class__.__name__}.__init__()")
+        self.log_call("__init__")
 
     def initialise(self):
-        self.logger.debug(f"{self.__class__.__name__}.initialise()")
+        self.log_call("initialise")
 
     def update(self):
         self.okon.set_depth(self.depth)
         new_status = Status.SUCCESS if self.okon.reachedTargetDepth(self.delta) else Status.RUNNING
         if new_status == Status.SUCCESS:
-            self.feedback_message = "Target depth of {self.depth} m reached."
-            self.feedback_message = (
-                f"Current depth {self.okon.sens['baro'] / 1000 / 9.81:.3f}. Waiting for target depth of {self.depth} m."
+            self.set_feedback("Target depth of {} m reached.", self.depth)
+        else:
+            self.set_feedback(
+                "Current depth {:.3f}. Waiting for target depth of {} m.", self.okon.sens.baro / 1000 / 9.81, self.depth
             )
-        self.logger.debug(f"{self.__class__.__name__}.update()[{self.status}->{new_status}][{self.feedback_message}]")
+        self.log_call("update", new_status)
         return new_status
 
     def update_depth(self, new_depth):
@@ -42,57 +77,61 @@ class SetDepth(py_trees.behaviour.Behaviour):
 
     def terminate(self, new_status):
         """Nothing to clean up in this example."""
-        self.logger.debug(f"{self.__class__.__name__}.terminate()[{self.status}->{new_status}]")
+        self.log_call("terminate", new_status)
 
 
-class SetVelocity(py_trees.behaviour.Behaviour):
+class SetVelocity(OkonBehaviour):
     def __init__(self, name: str = "set velocity", okon: Okon = None, x: float = 0.0, y: float = 0.0, z: float = 0.0):
         super().__init__(name)
         self.okon = okon
         self.x = x
         self.y = y
         self.z = z
-        self.logger.debug(f"{self.__class__.__name__}.__init__()")
+        self.log_call("__init__")
 
     def initialise(self):
-        self.logger.debug(f"{self.__class__.__name__}.initialise()")
+        self.log_call("initialise")
 
     def update(self):
         self.okon.set_stable_vel(x=self.x, y=self.y, z=self.z)
         new_status = Status.SUCCESS
         if new_status == Status.SUCCESS:
-            self.feedback_message = f"Speed set as: Vx = {self.x:.3f} Vy = {self.y:.3f} Vz = {self.z:.3f}."
-        self.logger.debug(f"{self.__class__.__name__}.update()[{self.status}->{new_status}][{self.feedback_message}]")
+            self.set_feedback("Speed set as: Vx = {:.3f} Vy = {:.3f} Vz = {:.3f}.", self.x, self.y, self.z)
+        self.log_call("update", new_status)
         return new_status
 
     def terminate(self, new_status):
         """Nothing to clean up in this example."""
-        self.logger.debug(f"{self.__class__.__name__}.terminate()[{self.status}->{new_status}]")
+        self.log_call("terminate", new_status)
 
 
-class Rotate(py_trees.behaviour.Behaviour):
+class Rotate(OkonBehaviour):
     def __init__(self, name: str = "rotate", okon: Okon = None, add_angle: float = 45.0, delta: float = 1.0):
         super().__init__(name)
         self.okon = okon
         self.add_angle = add_angle
-        self.target_angle = self.okon.sens["imu"]["rot"]["y"] + self.add_angle
+        self.target_angle = self.okon.sens.imu.rot.y + self.add_angle
         self.delta = delta
-        self.logger.debug(f"{self.__class__.__name__}.__init__()")
+        self.log_call("__init__")
 
     def initialise(self):
-        self.target_angle = self.okon.sens["imu"]["rot"]["y"] + self.add_angle
+        self.target_angle = self.okon.sens.imu.rot.y + self.add_angle
         if self.target_angle < 0.0:
             self.target_angle += 360.0
-        self.logger.debug(f"{self.__class__.__name__}.initialise()")
+        self.log_call("initialise")
 
     def update(self):
         self.okon.set_stable_rot(y=self.target_angle)
         new_status = Status.SUCCESS if self.okon.reachedTargetRotation(self.delta) else Status.RUNNING
         if new_status == Status.SUCCESS:
-            self.feedback_message = f"Target rotation of {self.target_angle} degrees reached."
+            self.set_feedback("Target rotation of {} degrees reached.", self.target_angle)
         else:
-            self.feedback_message = f"Current rotation is {self.okon.sens['imu']['rot']['y']:.3f} degrees. Waiting for target rotation of {self.target_angle:.3f} degrees."
-        self.logger.debug(f"{self.__class__.__name__}.update()[{self.status}->{new_status}][{self.feedback_message}]")
+            self.set_feedback(
+                "Current rotation is {:.3f} degrees. Waiting for target rotation of {:.3f} degrees.",
+                self.okon.sens.imu.rot.y,
+                self.target_angle,
+            )
+        self.log_call("update", new_status)
         return new_status
 
     def update_add_angle(self, new_add_angle):
@@ -100,81 +139,111 @@ class Rotate(py_trees.behaviour.Behaviour):
 
     def terminate(self, new_status):
         """Nothing to clean up in this example."""
-        self.logger.debug(f"{self.__class__.__name__}.terminate()[{self.status}->{new_status}]")
+        self.log_call("terminate", new_status)
 
 
-class RotateDeltaYawAngle(py_trees.behaviour.Behaviour):
+class RotateDeltaYawAngle(OkonBehaviour):
     def __init__(self, name: str = "rotate delta yaw angle", okon: Okon = None, delta: float = 1.0):
         super().__init__(name)
         self.okon = okon
         self.delta = delta
         self.blackboard = self.attach_blackboard_client()
         self.blackboard.register_key(key="deltaYaw", access=py_trees.common.Access.READ)
-        self.target_angle = self.okon.sens["imu"]["rot"]["y"]
-        self.logger.debug(f"{self.__class__.__name__}.__init__()")
+        self.target_angle = self.okon.sens.imu.rot.y
+        self.log_call("__init__")
 
     def initialise(self):
-        self.target_angle = self.okon.sens["imu"]["rot"]["y"] + self.blackboard.deltaYaw
+        self.target_angle = self.okon.sens.imu.rot.y + self.blackboard.deltaYaw
         if self.target_angle < 0.0:
             self.target_angle += 360.0
-        self.logger.debug(f"{self.__class__.__name__}.initialise()")
+        self.log_call("initialise")
 
     def update(self):
         self.okon.set_stable_rot(y=self.target_angle)
         new_status = Status.SUCCESS if self.okon.reachedTargetRotation(self.delta) else Status.RUNNING
         if new_status == Status.SUCCESS:
-            self.feedback_message = f"Target rotation of {self.target_angle} degrees reached."
+            self.set_feedback("Target rotation of {} degrees reached.", self.target_angle)
         else:
-            self.feedback_message = f"Current rotation is {self.okon.sens['imu']['rot']['y']:.3f} degrees. Waiting for target rotation of {self.target_angle:.3f} degrees."
-        self.logger.debug(f"{self.__class__.__name__}.update()[{self.status}->{new_status}][{self.feedback_message}]")
+            self.set_feedback(
+                "Current rotation is {:.3f} degrees. Waiting for target rotation of {:.3f} degrees.",
+                self.okon.sens.imu.rot.y,
+                self.target_angle,
+            )
+        self.log_call("update", new_status)
         return new_status
 
     def terminate(self, new_status):
         """Nothing to clean up in this example."""
-        self.logger.debug(f"{self.__class__.__name__}.terminate()[{self.status}->{new_status}]")
+        self.log_call("terminate", new_status)
 
 
-class TryDetectNTimes(py_trees.behaviour.Behaviour):
-    def __init__(self, name: str = "try detect n times", okon: Okon = None, object: str = "gate", n: int = 3):
+class TryDetectNTimes(OkonBehaviour):
+    """Succeeds when object is detected in one of n attempts, every attempt needs new detections.
+
+    An attempt waiting longer than timeout [s] for new detections (no GET_DETE replies) fails.
+    """
+
+    def __init__(
+        self, name: str = "try detect n times", okon: Okon = None, object: str = "gate", n: int = 3, timeout: float = 1.0
+    ):
         super().__init__(name)
         self.okon = okon
         self.object = object
         self.n = n
+        self.timeout = timeout
         self.counter = 1
+        self.last_seq = None  # seq of detections used in the last attempt
+        self.deadline = 0.0  # of the current attempt
         self.blackboard = self.attach_blackboard_client()
         self.blackboard.register_key(key="detection", access=py_trees.common.Access.WRITE)
-        self.logger.debug(f"{self.__class__.__name__}.__init__()")
+        self.log_call("__init__")
 
     def initialise(self):
         self.counter = 1
-        self.logger.debug(f"{self.__class__.__name__}.initialise()")
+        self.last_seq = None
+        self.deadline = time.monotonic() + self.timeout
+        self.log_call("initialise")
 
     def update(self):
-        detection = self.okon.get_detection(self.object)
-        if len(detection) > 0:
-            new_status = Status.SUCCESS
-            self.blackboard.detection = detection
-        elif self.counter == self.n:
-            new_status = Status.FAILURE
-        else:
+        detections = self.okon.detections
+        stale = detections.seq == self.last_seq  # no new detections since the last attempt
+        if stale and time.monotonic() < self.deadline:  # the attempt is not counted yet
+            self.set_feedback("Waiting for new detections for attempt number {}", self.counter)
             new_status = Status.RUNNING
-
-        if new_status == Status.SUCCESS:
-            self.feedback_message = f"Object {self.object} detected in attempt number {self.counter}"
         else:
-            self.feedback_message = f"Object {self.object} undetected in attempt number {self.counter}"
+            self.last_seq = detections.seq
+            self.deadline = time.monotonic() + self.timeout
+            detection = [] if stale else detections.get(self.object)
+            if len(detection) > 0:
+                new_status = Status.SUCCESS
+                self.blackboard.detection = detection
+            elif self.counter == self.n:
+                new_status = Status.FAILURE
+            else:
+                new_status = Status.RUNNING
+
+            if new_status == Status.SUCCESS:
+                self.set_feedback("Object {} detected in attempt number {}", self.object, self.counter)
+            elif stale:
+                self.set_feedback("No new detections in {} s for attempt number {}", self.timeout, self.counter)
+            else:
+                self.set_feedback("Object {} undetected in attempt number {}", self.object, self.counter)
 
-        self.counter += 1
+            self.counter += 1
 
-        self.logger.debug(f"{self.__class__.__name__}.update()[{self.status}->{new_status}][{self.feedback_message}]")
+        self.log_call("update", new_status)
         return new_status
 
+    def next_wake_up(self) -> float:
+        """Monotonic time when the current attempt times out, used by okon_runner.TickScheduler"""
+        return self.deadline
+
     def terminate(self, new_status):
         """Nothing to clean up in this example."""
-        self.logger.debug(f"{self.__class__.__name__}.terminate()[{self.status}->{new_status}]")
+        self.log_call("terminate", new_status)
 
 
-class CalculateDeltaYaw(py_trees.behaviour.Behaviour):
+class CalculateDeltaYaw(OkonBehaviour):
     def __init__(self, name: str = "calculate delta yaw", okon: Okon = None):
         super().__init__(name)
         self.okon = okon
@@ -182,10 +251,10 @@ class CalculateDeltaYaw(py_trees.behaviour.Behaviour):
         self.blackboard.register_key(key="detection", access=py_trees.common.Access.READ)
         self.blackboard.register_key(key="deltaYaw", access=py_trees.common.Access.WRITE)
         self.delta_yaw = 0
-        self.logger.debug(f"{self.__class__.__name__}.__init__()")
+        self.log_call("__init__")
 
     def initialise(self):
-        self.logger.debug(f"{self.__class__.__name__}.initialise()")
+        self.log_call("initialise")
 
     def update(self):
         detection = self.blackboard.detection
@@ -204,77 +273,119 @@ class CalculateDeltaYaw(py_trees.behaviour.Behaviour):
             new_status = Status.FAILURE
 
         if new_status == Status.SUCCESS:
-            self.feedback_message = f"Delta Yaw was calculated and is equal to {self.delta_yaw}"
+            self.set_feedback("Delta Yaw was calculated and is equal to {}", self.delta_yaw)
         else:
             self.feedback_message = "There were no objects in the detection parameter in blackboard."
 
-        self.logger.debug(f"{self.__class__.__name__}.update()[{self.status}->{new_status}][{self.feedback_message}]")
+        self.log_call("update", new_status)
         return new_status
 
     def terminate(self, new_status):
         """Nothing to clean up in this example."""
-        self.logger.debug(f"{self.__class__.__name__}.terminate()[{self.status}->{new_status}]")
+        self.log_call("terminate", new_status)
 
 
-class IsGateFarEnough(py_trees.behaviour.Behaviour):
+class IsGateFarEnough(OkonBehaviour):
     def __init__(self, name: str = "calculate delta yaw", okon: Okon = None, max_distance: float = 1.5):
         super().__init__(name)
         self.okon = okon
         self.max_distance = max_distance
         self.blackboard = self.attach_blackboard_client()
         self.blackboard.register_key(key="detection", access=py_trees.common.Access.READ)
-        self.logger.debug(f"{self.__class__.__name__}.__init__()")
+        self.log_call("__init__")
 
     def initialise(self):
-        self.logger.debug(f"{self.__class__.__name__}.initialise()")
+        self.log_call("initialise")
 
     def update(self):
         gate = self.blackboard.detection[0]
         new_status = Status.SUCCESS if gate["distance"] > self.max_distance else Status.FAILURE
 
         if new_status == Status.SUCCESS:
-            self.feedback_message = f"Gate is in distance of {gate['distance']:.3f} m."
+            self.set_feedback("Gate is in distance of {:.3f} m.", gate["distance"])
+        else:
+            self.set_feedback("Gate is closer than max distance set to {:.3f}m.", self.max_distance)
+
+        self.log_call("update", new_status)
+        return new_status
+
+    def terminate(self, new_status):
+        """Nothing to clean up in this example."""
+        self.log_call("terminate", new_status)
+
+
+class IsPathClear(OkonBehaviour):
+    def __init__(
+        self,
+        name: str = "is path clear",
+        depth_map: DepthMap = None,
+        min_distance: float = 1.0,
+        roi: tuple = (0.3, 0.3, 0.7, 0.7),
+    ):
+        super().__init__(name)
+        self.depth_map = depth_map
+        self.min_distance = min_distance
+        self.roi = roi
+        self.log_call("__init__")
+
+    def initialise(self):
+        self.log_call("initialise")
+
+    def update(self):
+        distance, _, _ = self.depth_map.nearest_obstacle(self.roi)
+        new_status = Status.SUCCESS if distance > self.min_distance else Status.FAILURE
+
+        if new_status == Status.SUCCESS:
+            self.set_feedback("Nearest obstacle is in distance of {:.3f} m.", distance)
         else:
-            self.feedback_message = f"Gate is closer than max distance set to {self.max_distance:.3f}m."
+            self.set_feedback("Obstacle is closer than min distance set to {:.3f} m.", self.min_distance)
 
-        self.logger.debug(f"{self.__class__.__name__}.update()[{self.status}->{new_status}][{self.feedback_message}]")
+        self.log_call("update", new_status)
         return new_status
 
     def terminate(self, new_status):
         """Nothing to clean up in this example."""
-        self.logger.debug(f"{self.__class__.__name__}.terminate()[{self.status}->{new_status}]")
+        self.log_call("terminate", new_status)
 
 
-class Wait(py_trees.behaviour.Behaviour):
+class Wait(OkonBehaviour):
     def __init__(self, name: str = "wait", okon: Okon = None, secs: float = 0.0):
         super().__init__(name)
         self.okon = okon
         self.secs = secs
-        self.logger.debug(f"{self.__class__.__name__}.__init__()")
+        self.deadline = 0.0
+        self.log_call("__init__")
 
     def initialise(self):
-        self.logger.debug(f"{self.__class__.__name__}.initialise()")
+        self.deadline = time.monotonic() + self.secs
+        self.log_call("initialise")
 
     def update(self):
-        time.sleep(self.secs)
-        new_status = Status.SUCCESS
+        remaining = self.deadline - time.monotonic()
+        new_status = Status.SUCCESS if remaining <= 0 else Status.RUNNING
         if new_status == Status.SUCCESS:
-            self.feedback_message = f"Robot waited for {self.secs} seconds."
-        self.logger.debug(f"{self.__class__.__name__}.update()[{self.status}->{new_status}][{self.feedback_message}]")
+            self.set_feedback("Robot waited for {} seconds.", self.secs)
+        else:
+            self.set_feedback("Waiting for {:.3f} more seconds.", remaining)
+        self.log_call("update", new_status)
         return new_status
 
+    def next_wake_up(self) -> float:
+        """Monotonic time when the wait ends, used by okon_runner.TickScheduler"""
+        return self.deadline
+
     def terminate(self, new_status):
         """Nothing to clean up in this example."""
-        self.logger.debug(f"{self.__class__.__name__}.terminate()[{self.status}->{new_status}]")
+        self.log_call("terminate", new_status)
 
 
-class Exit(py_trees.behaviour.Behaviour):
+class Exit(OkonBehaviour):
     def __init__(self, name: str = "exit"):
         super().__init__(name)
-        self.logger.debug(f"{self.__class__.__name__}.__init__()")
+        self.log_call("__init__")
 
     def initialise(self):
-        self.logger.debug(f"{self.__class__.__name__}.initialise()")
+        self.log_call("initialise")
 
     def update(self):
         sys.exit()
@@ -19,7 +19,7 @@ time.sleep(1.0)
 
 def create_root():
     """Implementation of py_trees behavior tree using okon_actions"""
-    root = py_trees.composites.Sequence("Sequence")
+    root = py_trees.composites.Sequence("Sequence", memory=True)
     set_depth_action_1 = SetDepth(name="Set Depth to 0.2 m", okon=oc.okon, depth=0.2, delta=0.005)
     rotate_action_2 = Rotate(name="Turn left", okon=oc.okon, add_angle=-45.0, delta=1.0)
     set_depth_action_3 = SetDepth(name="Set Depth to 0.8 m", okon=oc.okon, depth=0.8, delta=0.005)
@@ -38,7 +38,8 @@ def main():
     for tick in range(30):
         try:
             print(f"\n{f'{tick = }':.^30}\n")
-            root.tick_once()
+            with oc.okon.snapshot():
+                root.tick_once()
             print("\n")
             print(py_trees.display.unicode_tree(root=root, show_status=True))
             time.sleep(0.5)
@@ -0,0 +1,53 @@
+"""Vectorized versions of the angle functions of okon_client for batches of samples.
+
+Functions take numpy arrays (or anything convertible) of angles in degrees and
+give the same results as their scalar counterparts element by element.
+Euler angles are N x 3 arrays with x, y, z columns.
+
+    rot = rotations_from_dicts(record["rot"] for record in records)
+    errors = angle_difference(angle_norm(rot), target).max(axis=1)
+"""
+import numpy as np
+
+
+def angle0360(angle) -> np.ndarray:
+    return np.mod(np.mod(angle, 360) + 360, 360)
+
+
+def angle180(angle) -> np.ndarray:
+    angle = np.asarray(angle, dtype=float)
+    return np.where(angle > 180, angle - 360, angle)
+
+
+def angle_difference(angle1, angle2) -> np.ndarray:
+    diff = np.abs(np.mod(np.add(angle1, 360), 360) - np.mod(np.add(angle2, 360), 360))
+    return np.minimum(diff, 360 - diff)
+
+
+def angle_norm(rot) -> np.ndarray:
+    """Normalizes N x 3 Euler angles like okon_client.angle_norm normalizes a single {x, y, z} dict"""
+    rot = angle180(angle0360(np.asarray(rot, dtype=float)))
+    x, y, z = rot[..., 0], rot[..., 1], rot[..., 2]
+    flip = np.abs(x) > 90
+    return np.stack(
+        (
+            np.where(flip, angle180(angle0360(180 - x)), x),
+            np.where(flip, angle180(180 + y), y),
+            np.where(flip, angle180(angle0360(180 + z)), z),
+        ),
+        axis=-1,
+    )
+
+
+def reached_target_rotation(rot, target, delta: float) -> np.ndarray:
+    """Element-wise Okon.reachedTargetRotation of N x 3 rotations and targets"""
+    return np.all(angle_difference(target, rot) < delta, axis=-1)
+
+
+def rotations_from_dicts(rotations) -> np.ndarray:
+    """N x 3 array from an iterable of {x, y, z} dicts (or Vector3 states)"""
+    return np.array([(r["x"], r["y"], r["z"]) for r in rotations], dtype=float).reshape(-1, 3)
+
+
+def rotations_to_dicts(rot) -> list:
+    return [{"x": x, "y": y, "z": z} for x, y, z in np.asarray(rot, dtype=float).reshape(-1, 3).tolist()]
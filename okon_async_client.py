@@ -0,0 +1,249 @@
+"""asyncio version of OkonClient.
+
+Speaks the same protocol as OkonClient, but runs in an asyncio event loop
+instead of separate receive/sync threads, so the behavior tree, vision
+consumers and the client can share one event loop.
+
+    async def main():
+        oc = AsyncOkonClient(ip="127.0.0.1", port=44210, sync_interval=0.05, debug=False)
+        if await oc.connect():
+            oc.okon.set_depth(0.6)
+            await oc.send(PacketType.PING, PacketFlag.NONE, str(time.time()))
+            async for packet_type, packet_flag, data in oc.packets():
+                ...
+
+    asyncio.run(main())
+"""
+import asyncio
+import time
+from functools import partial
+
+from okon_client import PACKET_HEADER, OkonClient, OutboundQueue, PacketFlag, pack_packet, send_policy
+
+
+def _copy_outcome(target: asyncio.Future, source: asyncio.Future) -> None:
+    if target.done():
+        return
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(None)
+
+
+class AsyncOutboundQueue(OutboundQueue):
+    """OutboundQueue used in the event loop, entries carry a future (index 5) done when written.
+
+    Futures of dropped entries are cancelled, _send_task() waits for packets by get().
+    """
+
+    def __init__(self, max_size: int = 256) -> None:
+        super().__init__(max_size)
+        self._ready = asyncio.Event()
+
+    def _notify(self) -> None:
+        self._ready.set()
+
+    def _discard(self, entry: list) -> None:
+        entry[5].cancel()
+
+    async def get(self) -> list:
+        """Waits for packets and returns all queued ones, safety packets first"""
+        while not self.depth():
+            self._ready.clear()
+            await self._ready.wait()
+        return self.get_all(0)
+
+
+class AsyncOkonClient(OkonClient):
+    """OkonClient using asyncio streams, Okon and Simulation facades work the same way.
+
+    Event handlers are called in the event loop (coroutine functions are scheduled as tasks)
+    instead of the worker pool, so they must not block. send(), setpoints and disconnect() may also
+    be used from other threads, their work is handed over to the event loop of connect().
+    """
+
+    def __init__(self, ip, port, options=None, sync_interval=0.05, debug=True, nodelay=True, **kwargs) -> None:
+        super().__init__(ip, port, options, sync_interval, debug, nodelay, **kwargs)
+        self._to_send = AsyncOutboundQueue(self._to_send.max_size)
+        self._loop = None  # event loop of connect()
+        self._reader = None
+        self._writer = None
+        self._tasks = []
+        self._subscribers = set()
+
+    async def connect(self) -> bool:
+        if self.debug:
+            print(f"Connecting to {self.ip}:{self.port}")
+        self._loop = asyncio.get_running_loop()
+        try:
+            self._reader, self._writer = await asyncio.open_connection(self.ip, self.port)
+        except OSError as err:
+            print(f"failed to connect {err}")
+            return False
+        self.socket = self._writer.get_extra_info("socket")
+        self.set_nodelay(self.nodelay)
+        self._sent_setpoints.clear()
+        self.connected = True
+        self._tasks = [
+            asyncio.create_task(self._comm_task()),
+            asyncio.create_task(self._send_task()),
+            asyncio.create_task(self._sync_task()),
+        ]
+        if self._setpoints:
+            self.flush_setpoints()
+        return True
+
+    def send(
+        self, packet_type: int, packet_flag: int = PacketFlag.NONE, json: str = None, stamp: tuple = None
+    ) -> asyncio.Future:
+        """Queues a packet, returned future is done when the packet is written to the socket.
+
+        Send policies of OkonClient apply: the future of a packet merged into a queued one is done
+        with the queued one, the future of a dropped packet is cancelled.
+        Awaiting the future is optional, so synchronous callers (Okon, Simulation) can ignore it.
+        """
+        data_bytes = b"" if json is None else json.encode()
+        sent = (self._loop or asyncio.get_running_loop()).create_future()
+        frame = pack_packet(packet_type, packet_flag, data_bytes)
+        now = time.monotonic()
+        if stamp is not None and len(stamp) == 3:
+            stamp = (*stamp, now)
+        entry = [packet_type, packet_flag, frame, now, stamp, sent]
+        self._call_in_loop(self._queue_entry, entry, send_policy(packet_type, data_bytes))
+        return sent
+
+    def _queue_entry(self, entry: list, policy: str) -> None:
+        queued = self._to_send.put(entry, policy)
+        if queued is not entry:
+            queued[5].add_done_callback(partial(_copy_outcome, entry[5]))
+
+    def _in_loop(self) -> bool:
+        """True when called from the thread running the event loop of the client"""
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _call_in_loop(self, callback, *args) -> None:
+        """Calls callback right away in the event loop of the client, schedules it from other threads"""
+        if self._loop is None or self._in_loop():
+            callback(*args)
+        else:
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    def _schedule_setpoint_flush(self) -> None:
+        loop = self._loop
+        if loop is None:  # setpoints set before connect() are flushed by it
+            return
+        try:
+            if self._in_loop():
+                loop.call_later(self.setpoint_window, self.flush_setpoints)
+            else:
+                loop.call_soon_threadsafe(loop.call_later, self.setpoint_window, self.flush_setpoints)
+        except RuntimeError:  # the loop is closed, the setpoints stay queued for the next connect()
+            self._setpoint_deadline = None
+
+    async def packets(self):
+        """Async iterator of (packet_type, packet_flag, data) of every received packet, after it is handled"""
+        queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        try:
+            while self.connected or not queue.empty():
+                packet = await queue.get()
+                if packet is None:
+                    return
+                yield packet
+        finally:
+            self._subscribers.discard(queue)
+
+    def disconnect(self) -> None:
+        self.connected = False
+        self._call_in_loop(self._close)
+
+    def _close(self) -> None:
+        for task in self._tasks:
+            if task is not asyncio.current_task():
+                task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+        self.stop_recording()
+        for packet in self._to_send.get_all(0):
+            packet[5].cancel()
+        for queue in self._subscribers:
+            queue.put_nowait(None)
+        self._emit_event("disconnect")
+
+    async def _send_task(self) -> None:
+        while self.connected:
+            packets = await self._to_send.get()
+            try:
+                self._writer.writelines([packet[2] for packet in packets])
+                await self._writer.drain()
+            except asyncio.CancelledError:  # by disconnect()
+                for packet in packets:
+                    packet[5].cancel()
+                raise
+            except OSError as err:  # connection lost
+                print(f"failed to send {err}")
+                for packet in packets:
+                    if not packet[5].done():
+                        packet[5].set_exception(err)
+                        packet[5].exception()  # awaiting is optional, ignored futures are not logged
+                if self.connected:
+                    self.disconnect()
+                return
+            recorder = self.recorder
+            if recorder is not None:
+                self._record_sent(recorder, packets)
+            if self.debug:
+                self._log_sent(packets)
+            sent_time = time.monotonic()
+            for packet in packets:
+                self.queue_latency.add(sent_time - packet[3])
+                if packet[4] is not None:
+                    self._trace_latency(packet[4], sent_time)
+                if not packet[5].done():
+                    packet[5].set_result(None)
+
+    async def _sync_task(self) -> None:
+        poll_plan = self.simulation.poll_plan
+        poll_plan.start(time.monotonic())
+        while self.connected:
+            next_sync = poll_plan.next_time()
+            await asyncio.sleep(min(next_sync - time.monotonic(), 1.0))
+            if next_sync > time.monotonic():
+                continue
+            self.syncTime = time.monotonic()
+            self.sync_jitter.add(self.syncTime - next_sync)
+            self.simulation.poll(self.syncTime)
+
+    async def _comm_task(self) -> None:
+        try:
+            while self.connected:
+                header = await self._reader.readexactly(PACKET_HEADER.size)
+                packet_type, packet_flag, length = PACKET_HEADER.unpack(header)
+                data = await self._reader.readexactly(length)
+                self._handle_packet(packet_type, packet_flag, memoryview(data))
+                for queue in self._subscribers:
+                    queue.put_nowait((packet_type, packet_flag, data))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # connection closed by the server
+        finally:
+            if self.connected:
+                self.disconnect()
+
+    def _emit_event(self, name: str, args=None) -> None:
+        for e in self._inline_events.get(name, ()):
+            e(args)
+        if name in self._events:
+            self._call_in_loop(self._dispatch_event, name, args)
+
+    def _dispatch_event(self, name: str, args) -> None:
+        loop = asyncio.get_running_loop()
+        for e in self._events[name]:
+            if asyncio.iscoroutinefunction(e):
+                loop.create_task(e(args))
+            else:
+                loop.call_soon(e, args)
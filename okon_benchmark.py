@@ -0,0 +1,445 @@
+"""Benchmarks of the OKON client and behavior tree hot paths.
+
+Benchmarks run against a local stand-in server, so Okon.exe is not needed.
+Results are written as JSON, so runs of different commits can be compared.
+
+    python okon_benchmark.py --output before.json
+    python okon_benchmark.py --output after.json --baseline before.json
+"""
+import argparse
+import json
+import platform
+import random
+import socket
+import subprocess
+import time
+from threading import Thread
+
+import okon_angles
+from okon_client import PACKET_HEADER, Okon, OkonClient, OutboundQueue, PacketFlag, PacketType, SendPolicy, angle_norm
+from okon_events import Overflow
+from okon_metrics import RollingStats
+from okon_sim_server import OkonSimServer
+
+
+def _vector(x: float = 0.0, y: float = 0.0, z: float = 0.0) -> dict:
+    return {"x": x, "y": y, "z": z}
+
+
+SAMPLE_PACKETS = {
+    PacketType.GET_SENS: {
+        "rot": _vector(1.2, 183.4, -0.7),
+        "rotSpeed": _vector(0.01, 0.5, 0.0),
+        "rotAccel": _vector(0.0, 0.02, 0.0),
+        "accel": _vector(0.1, -9.81, 0.3),
+        "baro": {"pressure": 10791.0},
+    },
+    PacketType.SET_ORIEN: {"pos": _vector(1.5, -1.1, 4.2), "rot": _vector(1.2, 183.4, -0.7)},
+    PacketType.GET_DETE: [
+        {
+            "className": class_name,
+            "visibleInFrame": True,
+            "min": {"x": 0.4, "y": 0.3},
+            "max": {"x": 0.6, "y": 0.7},
+            "distance": distance,
+        }
+        for class_name, distance in (("gate", 4.2), ("gate", 6.3), ("flare", 2.1), ("buoy", 3.7))
+    ],
+    PacketType.SET_STABLE: {"rot": _vector(0, 90, 0), "vel": _vector(0, 0, 1), "depth": 1.1},
+    PacketType.SET_PID: {
+        axis: {"P": 1.0, "I": 0.1, "D": 0.01, "limit": 10.0} for axis in ("roll", "pitch", "yaw", "depth")
+    },
+    PacketType.SET_CONTROL_MODE: "stable",
+    PacketType.PING: "1690000000.123",
+}
+
+
+def sample_payload(packet_type: int) -> bytes:
+    data = SAMPLE_PACKETS[packet_type]
+    return (data if isinstance(data, str) else json.dumps(data)).encode()
+
+
+class CountingSocket:
+    """Socket proxy counting write syscalls made by the client"""
+
+    def __init__(self, sock: socket.socket) -> None:
+        self._socket = sock
+        self.write_calls = 0
+
+    def sendall(self, data) -> None:
+        self.write_calls += 1
+        self._socket.sendall(data)
+
+    def sendmsg(self, buffers) -> int:
+        self.write_calls += 1
+        return self._socket.sendmsg(buffers)
+
+    def __getattr__(self, name: str):
+        return getattr(self._socket, name)
+
+
+class SinkServer:
+    """Stand-in server which only counts received packets"""
+
+    def __init__(self, ip: str = "127.0.0.1", port: int = 0) -> None:
+        self.server = socket.create_server((ip, port))
+        self.ip, self.port = self.server.getsockname()
+        self.received = 0
+        Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self) -> None:
+        conn, _ = self.server.accept()
+        buffer = b""
+        while True:
+            chunk = conn.recv(1 << 16)
+            if not chunk:
+                break
+            buffer += chunk
+            while len(buffer) >= PACKET_HEADER.size:
+                _, _, length = PACKET_HEADER.unpack_from(buffer)
+                if len(buffer) < PACKET_HEADER.size + length:
+                    break
+                buffer = buffer[PACKET_HEADER.size + length :]
+                self.received += 1
+
+
+class _FifoQueue(OutboundQueue):
+    """Unbounded queue of all packets in order, like the queue of the client before send policies"""
+
+    def __init__(self) -> None:
+        super().__init__(max_size=float("inf"))
+
+    def put(self, entry: list, policy: str = SendPolicy.NORMAL) -> list:
+        return super().put(entry, SendPolicy.NORMAL)
+
+
+class LegacyOkonClient(OkonClient):
+    """Client writing every packet field with a separate sendall call (pre-framing behaviour)"""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._to_send = _FifoQueue()
+
+    def _send(self, packets: list) -> None:
+        for packet_type, packet_flag, frame, *_ in packets:
+            data_bytes = frame[PACKET_HEADER.size :]
+            self.socket.sendall(packet_type.to_bytes(1, byteorder="little"))
+            self.socket.sendall(packet_flag.to_bytes(1, byteorder="little"))
+            self.socket.sendall(len(data_bytes).to_bytes(4, byteorder="little"))
+            if len(data_bytes) > 0:
+                self.socket.sendall(data_bytes)
+
+
+def bench_send(client_class=OkonClient, n: int = 100_000, nodelay: bool = True) -> dict:
+    """Measures packets per second and write syscalls per packet of the client send path"""
+    server = SinkServer()
+    # no syncs and room for all packets, pings with data are neither deduplicated nor replaced
+    oc = client_class(server.ip, server.port, sync_interval=3600, debug=False, nodelay=nodelay, send_queue_size=2 * n)
+    oc.connect()
+    oc.socket = CountingSocket(oc.socket)
+
+    start = time.perf_counter()
+    for _ in range(n):
+        oc.send(PacketType.PING, PacketFlag.NONE, "1")
+    while server.received < n:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    oc.disconnect()
+
+    return {
+        "client": client_class.__name__,
+        "nodelay": nodelay,
+        "packets": n,
+        "packets_per_second": n / elapsed,
+        "syscalls_per_packet": oc.socket.write_calls / n,
+    }
+
+
+def bench_sync(duration: float = 2.0, sync_interval: float = 0.05) -> dict:
+    """Measures CPU time used by an idle client, its sync jitter and queue-to-wire latency of commands"""
+    server = SinkServer()
+    oc = OkonClient(server.ip, server.port, sync_interval=sync_interval, debug=False)
+    oc.connect()
+    cpu_start = time.process_time()
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        oc.send(PacketType.PING, PacketFlag.NONE, "1")
+        time.sleep(0.01)
+    cpu_time = time.process_time() - cpu_start
+    oc.disconnect()
+
+    return {
+        "cpu_usage": cpu_time / duration,
+        "sync_jitter": oc.sync_jitter.summary(),
+        "queue_latency": oc.queue_latency.summary(),
+    }
+
+
+def bench_events(n: int = 10_000) -> dict:
+    """Measures events per second handled with a thread per event and with the client's worker pool"""
+    result = {}
+    handled = []
+    # blocking, so every event is handled like with a thread per event
+    oc = OkonClient("127.0.0.1", 0, debug=False, event_overflow=Overflow.BLOCK)
+    oc.on_event("ping", handled.append)
+
+    start = time.perf_counter()
+    for i in range(n):  # pre-pool behaviour
+        Thread(target=handled.append, args=(i,), daemon=True).start()
+    while len(handled) < n:
+        time.sleep(0.001)
+    result["thread_per_event"] = n / (time.perf_counter() - start)
+
+    handled.clear()
+    start = time.perf_counter()
+    for i in range(n):
+        oc._emit_event("ping", i)
+    while len(handled) < n:
+        time.sleep(0.001)
+    result["worker_pool"] = n / (time.perf_counter() - start)
+    result["dispatcher"] = oc._event_dispatcher.get_stats()
+    return result
+
+
+def bench_handle_packet(n: int = 20_000) -> dict:
+    """Measures time per received packet of every sample packet type to handle it and read its state once [s]
+
+    State packets are decoded lazily, so every packet is followed by the decoding done by the
+    first read of okon.sens, okon.orien, ... like in a tree ticked on every packet.
+    """
+    oc = OkonClient("127.0.0.1", 0, debug=False)
+    result = {}
+    for packet_type in SAMPLE_PACKETS:
+        data = memoryview(sample_payload(packet_type))
+        state = packet_type in Okon._DECODERS
+        start = time.perf_counter()
+        for _ in range(n):
+            oc._handle_packet(packet_type, PacketFlag.DO_NOT_LOG_PACKET, data)
+            if state:
+                oc.okon._decode_pending(packet_type)  # what the state properties do on the first read
+        result[PacketType.get(packet_type)] = (time.perf_counter() - start) / n
+    return result
+
+
+def bench_decode(n: int = 20_000) -> dict:
+    """Measures time to decode one packet of every sample state packet type into Okon state [s]"""
+    okon = OkonClient("127.0.0.1", 0, debug=False).okon
+    result = {}
+    for packet_type in SAMPLE_PACKETS:
+        decoder = Okon._DECODERS.get(packet_type)
+        if decoder is None:  # not a state packet
+            continue
+        data = sample_payload(packet_type)
+        start = time.perf_counter()
+        for _ in range(n):
+            decoder(okon, data)
+        result[PacketType.get(packet_type)] = (time.perf_counter() - start) / n
+    return result
+
+
+def bench_ping(n: int = 1000, interval: float = 0.001, latency: float = 0.0, jitter: float = 0.0) -> dict:
+    """Measures round-trip time of PING packets through the client and the simulator server [s]"""
+    rtt = RollingStats(n)
+    with OkonSimServer(port=0, latency=latency, jitter=jitter) as server:
+        oc = OkonClient(server.ip, server.port, debug=False)
+        oc.on_event("ping", lambda sent: rtt.add(time.perf_counter() - float(sent)), inline=True)
+        oc.connect()
+        for _ in range(n):
+            oc.send(PacketType.PING, PacketFlag.DO_NOT_LOG_PACKET, repr(time.perf_counter()))
+            time.sleep(interval)
+        end = time.monotonic() + 1.0 + latency + jitter
+        while rtt.count < n and time.monotonic() < end:
+            time.sleep(0.001)
+        oc.disconnect()
+    return dict(rtt.summary(), lost=n - rtt.count)
+
+
+def bench_receive(duration: float = 1.0, packet_type: int = PacketType.GET_SENS) -> dict:
+    """Measures packets per second received and handled by the client while the server floods it"""
+    with OkonSimServer(port=0) as server:
+        oc = OkonClient(server.ip, server.port, sync_interval=3600, debug=False)  # no syncs
+        received = [0]
+
+        def count(data) -> None:
+            received[0] += 1
+
+        oc.on_frame(packet_type, count)
+        oc.connect()
+        server.flood(packet_type)
+        time.sleep(0.1)  # warm up
+        start_count, start = received[0], time.perf_counter()
+        time.sleep(duration)
+        n, elapsed = received[0] - start_count, time.perf_counter() - start
+        server.flood(None)
+        oc.disconnect()
+    return {"packet_type": PacketType.get(packet_type), "packets": n, "packets_per_second": n / elapsed}
+
+
+def bench_angles(n: int = 100_000) -> dict:
+    """Measures angles normalized per second (one by one and in a batch) and get_detection calls per second"""
+    rng = random.Random(0)
+    angles = [{"x": rng.uniform(-360, 360), "y": rng.uniform(-360, 360), "z": rng.uniform(-360, 360)} for _ in range(n)]
+    start = time.perf_counter()
+    for a in angles:
+        angle_norm(a)
+    angle_norm_rate = n / (time.perf_counter() - start)
+
+    rotations = okon_angles.rotations_from_dicts(angles)
+    start = time.perf_counter()
+    okon_angles.angle_norm(rotations)
+    vectorized_rate = n / (time.perf_counter() - start)
+
+    oc = OkonClient("127.0.0.1", 0, debug=False)
+    oc._handle_packet(PacketType.GET_DETE, PacketFlag.DO_NOT_LOG_PACKET, memoryview(sample_payload(PacketType.GET_DETE)))
+    okon = oc.okon
+    start = time.perf_counter()
+    for _ in range(n):
+        okon.get_detection("gate")
+    get_detection_rate = n / (time.perf_counter() - start)
+    return {
+        "angle_norm_per_second": angle_norm_rate,
+        "vectorized_angle_norm_per_second": vectorized_rate,
+        "get_detection_per_second": get_detection_rate,
+    }
+
+
+def bench_tree_tick(ticks: int = 200, interval: float = 0.01, profile: bool = False) -> dict:
+    """Measures tick latency of the qualification task tree flown against the simulator server [s].
+
+    With profile the tree is instrumented by okon_profiler.BehaviourProfiler.
+    """
+    import py_trees
+
+    from okon_profiler import BehaviourProfiler
+    from qualification_task_behavior_tree import create_root
+
+    tick_time = RollingStats(ticks)
+    with OkonSimServer(port=0) as server:
+        oc = OkonClient(server.ip, server.port, debug=False)
+        oc.connect()
+        time.sleep(0.2)  # first syncs
+        py_trees.logging.level = py_trees.logging.Level.WARN
+        root = create_root(oc.okon)
+        root.setup_with_descendants()
+        if profile:
+            BehaviourProfiler().attach(root)
+        for _ in range(ticks):
+            start = time.perf_counter()
+            try:
+                with oc.okon.snapshot():
+                    root.tick_once()
+            except SystemExit:  # Exit behaviour
+                break
+            tick_time.add(time.perf_counter() - start)
+            time.sleep(interval)
+        oc.disconnect()
+    return dict(tick_time.summary(), status=str(root.status))
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_all() -> dict:
+    results = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.time(),
+        "send": [
+            bench_send(client_class, nodelay=nodelay)
+            for client_class in (LegacyOkonClient, OkonClient)
+            for nodelay in (False, True)
+        ],
+        "receive": bench_receive(),
+        "ping": bench_ping(),
+        "handle_packet": bench_handle_packet(),
+        "decode": bench_decode(),
+        "angles": bench_angles(),
+        "events": bench_events(),
+        "sync": bench_sync(),
+        "tree_tick": bench_tree_tick(),
+        "tree_tick_profiled": bench_tree_tick(profile=True),
+    }
+    return results
+
+
+def _flatten(results, prefix: str = "") -> dict:
+    """Numeric results keyed by their path (send.1.packets_per_second)"""
+    if isinstance(results, dict):
+        items = results.items()
+    elif isinstance(results, list):
+        items = enumerate(results)
+    else:
+        return {prefix: results} if isinstance(results, (int, float)) and not isinstance(results, bool) else {}
+    flat = {}
+    for key, value in items:
+        flat.update(_flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+
+def compare(baseline: dict, results: dict) -> dict:
+    """Ratios of results to the baseline of all numeric results present in both"""
+    old, new = _flatten(baseline), _flatten(results)
+    return {key: new[key] / old[key] for key in new if key != "time" and old.get(key)}
+
+
+def print_results(results: dict) -> None:
+    for result in results["send"]:
+        print(
+            f"{result['client']:>16} nodelay={result['nodelay']!s:<5} "
+            f"{result['packets_per_second']:>10.0f} packets/s "
+            f"{result['syscalls_per_packet']:.3f} syscalls/packet"
+        )
+    result = results["receive"]
+    print(f"received {result['packet_type']} {result['packets_per_second']:.0f} packets/s")
+    result = results["ping"]
+    print(f"ping rtt p50 {result['p50'] * 1000:.3f} ms p99 {result['p99'] * 1000:.3f} ms lost {result['lost']}")
+    for name, duration in results["handle_packet"].items():
+        print(f"_handle_packet + read {name:>16} {duration * 1e6:.2f} us/packet")
+    for name, duration in results["decode"].items():
+        print(f"decode {name:>16} {duration * 1e6:.2f} us/packet")
+    result = results["angles"]
+    print(
+        f"angle_norm {result['angle_norm_per_second']:.0f}/s "
+        f"vectorized {result['vectorized_angle_norm_per_second']:.0f}/s "
+        f"get_detection {result['get_detection_per_second']:.0f}/s"
+    )
+    result = results["events"]
+    print(
+        f"events/s: thread per event {result['thread_per_event']:.0f} worker pool {result['worker_pool']:.0f} "
+        f"(max queue depth {result['dispatcher']['max_queue_depth']})"
+    )
+    result = results["sync"]
+    print(
+        f"cpu usage {result['cpu_usage'] * 100:.1f}% "
+        f"sync jitter p50 {result['sync_jitter']['p50'] * 1000:.3f} ms p99 {result['sync_jitter']['p99'] * 1000:.3f} ms "
+        f"queue latency p50 {result['queue_latency']['p50'] * 1000:.3f} ms p99 {result['queue_latency']['p99'] * 1000:.3f} ms"
+    )
+    result = results["tree_tick"]
+    print(f"tree tick p50 {result['p50'] * 1000:.3f} ms p99 {result['p99'] * 1000:.3f} ms max {result['max'] * 1000:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OKON client benchmarks")
+    parser.add_argument("--output", help="path of the JSON file with results")
+    parser.add_argument("--baseline", help="JSON file with results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    results = run_all()
+    print_results(results)
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["baseline_ratio"] = compare(json.load(f), results)
+        for key, ratio in results["baseline_ratio"].items():
+            print(f"{key:<50} {ratio:8.3f}x")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,24 @@
 import json
 import socket
+import struct
 import time
-from queue import Queue
-from threading import Thread
+import zlib
+from contextlib import contextmanager
+from collections import deque
+from threading import Condition, Lock, Thread
 
 from numpy import number
 
+try:
+    import orjson
+except ImportError:  # optional, faster JSON decoding
+    orjson = None
+
+from okon_events import EventDispatcher, Overflow
+from okon_metrics import LatencyMonitor, RollingStats
+from okon_recorder import RECEIVED, SENT, TelemetryRecorder
+from okon_state import Control, DetectionIndex, Orientation, Sensors
+
 
 class PacketType:  # PacketType.PING
     SET_MTR = 0xA0
@@ -37,9 +50,10 @@ class PacketType:  # PacketType.PING
     GET_DETE = 0xDE
 
     def get(val: int) -> str:  # PacketType.get(0xA5)
-        for k, v in vars(PacketType).items():
-            if v == val:
-                return k
+        return _PACKET_TYPE_NAMES.get(val)
+
+
+_PACKET_TYPE_NAMES = {v: k for k, v in vars(PacketType).items() if isinstance(v, int)}
 
 
 class PacketFlag:  # PacketType.PING
@@ -61,131 +75,373 @@ class PacketFlag:  # PacketType.PING
         return flags
 
 
+_FROZEN = dict()  # never filled, state getters see no pending packets while frozen
+
+
 class Okon:
     def __init__(self, okon_client) -> None:
         self._okon_client = okon_client
-        self.sens = {
-            "imu": {
-                "rot": {"x": 0, "y": 0, "z": 0},
-                "rotSpeed": {"x": 0, "y": 0, "z": 0},
-                "rotAccel": {"x": 0, "y": 0, "z": 0},
-                "accel": {"x": 0, "y": 0, "z": 0},
-            },
-            "baro": 0,
-            "detection": [],
-        }
-        self.control = {
-            "mode": "unknown",
-            "stable": {
-                "rot": {"x": 0, "y": 0, "z": 0},
-                "vel": {"x": 0, "y": 0, "z": 0},
-                "depth": 1.3,
-            },
-            "acro": {
-                "rotSpeed": {"x": 0, "y": 0, "z": 0},
-                "vel": {"x": 0, "y": 0, "z": 0},
-            },
-            "manual": {
-                "FLH": 0,
-                "FLV": 0,
-                "BLV": 0,
-                "BLH": 0,
-                "FRH": 0,
-                "FRV": 0,
-                "BRV": 0,
-                "BRH": 0,
-            },
-        }
-        self.orien = {"pos": {"x": 0, "y": 0, "z": 0}, "rot": {"x": 0, "y": 0, "z": 0}}
-        self.pids = None  # pids get from syncing with the server
+        self._received = dict()  # packet type -> data of the last received state packet, decoded on first access
+        self._pending = self._received  # checked by state getters, an empty dict while frozen
+        self._decode_lock = Lock()
+        self.frozen = False
+        self.snapshot_time = 0.0  # monotonic time of the last freeze()
+        self.snapshot_seq = 0  # number of freeze() calls
+        self.receive_seq = 0  # number of received GET_SENS and GET_DETE packets
+        self._receive_stamp = (0, 0.0)  # (receive_seq, monotonic receive time) of the last of them
+        self.snapshot_stamp = (0, 0.0)  # _receive_stamp of the state frozen by the last freeze()
+        self._sens = Sensors()
+        self._control = Control()
+        self._orien = Orientation()
+        self._detections = DetectionIndex()
+        self._detection_seq = 0  # number of received GET_DETE packets
+        self._detection_time = 0.0  # monotonic time of receiving the last GET_DETE packet
+        self._pids = None  # pids get from syncing with the server
+        self._stable_key = None  # setpoint values of the cached _stable_json
+        self._stable_json = None
+
+    @property
+    def sens(self) -> dict:
+        if self._pending:
+            self._decode_pending(PacketType.GET_SENS, PacketType.GET_DETE)
+        return self._sens
+
+    @sens.setter
+    def sens(self, sens: dict) -> None:
+        self._sens.update(sens)
+
+    @property
+    def control(self) -> dict:
+        if self._pending:
+            self._decode_pending(
+                PacketType.SET_CONTROL_MODE, PacketType.SET_STABLE, PacketType.SET_ACRO, PacketType.SET_MTR
+            )
+        return self._control
+
+    @control.setter
+    def control(self, control: dict) -> None:
+        self._control.update(control)
+
+    @property
+    def orien(self) -> dict:
+        if self._pending:
+            self._decode_pending(PacketType.SET_ORIEN)
+        return self._orien
+
+    @orien.setter
+    def orien(self, orien: dict) -> None:
+        self._orien.update(orien)
+
+    @property
+    def detections(self) -> DetectionIndex:
+        """Index of the last received detections, its seq tells whether they are new"""
+        if PacketType.GET_DETE in self._pending:
+            self._decode_pending(PacketType.GET_DETE)
+        return self._detections
+
+    @property
+    def pids(self) -> dict:
+        if self._pending:
+            self._decode_pending(PacketType.SET_PID)
+        return self._pids
+
+    @pids.setter
+    def pids(self, pids: dict) -> None:
+        self._pids = pids
+
+    def update(self, packet_type: int, data) -> None:
+        """Stores data of a received state packet, it is decoded on the first access to the state"""
+        self._received[packet_type] = bytes(data)
+        if packet_type == PacketType.GET_SENS:
+            self.receive_seq += 1
+            self._receive_stamp = (self.receive_seq, time.monotonic())
+
+    def update_detection(self, data) -> None:
+        """Stores data of a received GET_DETE packet, it is decoded and indexed on the first access"""
+        self._received[PacketType.GET_DETE] = bytes(data)
+        self._detection_seq += 1
+        self._detection_time = time.monotonic()
+        self.receive_seq += 1
+        self._receive_stamp = (self.receive_seq, self._detection_time)
+
+    @property
+    def stamp(self) -> tuple:
+        """Causal stamp (receive seq, receive time, tick time) of the state decisions are made on.
+
+        While frozen it is the stamp of the snapshot and the tick time is the time of freeze(),
+        otherwise the stamp of the last received packet without a tick time (None).
+        """
+        if self.frozen:
+            return (*self.snapshot_stamp, self.snapshot_time)
+        return (*self._receive_stamp, None)
+
+    def _decode_pending(self, *packet_types: int) -> None:
+        with self._decode_lock:  # packets of one type are decoded in order even with several reading threads
+            for packet_type in packet_types:
+                data = self._received.pop(packet_type, None)
+                if data is not None:
+                    self._DECODERS[packet_type](self, data)
+
+    def freeze(self) -> None:
+        """Decodes all received state and keeps it unchanged until unfreeze() (or the next freeze()).
+
+        Packets received while frozen are only stored, so all reads (from any thread) see
+        one consistent view. Reads of frozen state cost the same as reads of live state.
+        """
+        stamp = self._receive_stamp  # taken first, the decoded state is at least as new as the stamp
+        self._decode_pending(*self._DECODERS)
+        self.snapshot_stamp = stamp
+        self._pending = _FROZEN
+        self.frozen = True
+        self.snapshot_time = time.monotonic()
+        self.snapshot_seq += 1
+
+    def unfreeze(self) -> None:
+        self.frozen = False
+        self._pending = self._received
+
+    @contextmanager
+    def snapshot(self):
+        """Freezes the state for the duration of the with block (e.g. one behavior tree tick)"""
+        self.freeze()
+        try:
+            yield self
+        finally:
+            self.unfreeze()
+
+    def _decode_manual(self, data: bytes) -> None:
+        self._control.manual.update(decode_json(data))
+
+    def _decode_mode(self, data: bytes) -> None:
+        self._control.mode = data.decode()
+
+    def _decode_acro(self, data: bytes) -> None:
+        self._control.acro.update(decode_json(data))
+
+    def _decode_stable(self, data: bytes) -> None:
+        self._control.stable.update(decode_json(data))
+
+    def _decode_pids(self, data: bytes) -> None:
+        self._pids = decode_json(data)
+
+    def _decode_sens(self, data: bytes) -> None:
+        sens = decode_json(data)
+        sens["rot "] = angle_norm(sens["rot"])
+        self._sens.baro = sens["baro"]["pressure"]
+        self._sens.imu.update(sens)
+
+    def _decode_orien(self, data: bytes) -> None:
+        orien = decode_json(data)
+        self._orien.pos.update(orien["pos"])
+        self._orien.rot.update(angle_norm(orien["rot"]))
+
+    def _decode_detection(self, data: bytes) -> None:
+        detection = decode_json(data)
+        self._sens.detection = detection
+        self._detections = DetectionIndex(detection, self._detection_seq, self._detection_time)
+
+    _DECODERS = {
+        PacketType.SET_MTR: _decode_manual,
+        PacketType.SET_CONTROL_MODE: _decode_mode,
+        PacketType.SET_ACRO: _decode_acro,
+        PacketType.SET_STABLE: _decode_stable,
+        PacketType.SET_PID: _decode_pids,
+        PacketType.GET_SENS: _decode_sens,
+        PacketType.SET_ORIEN: _decode_orien,
+        PacketType.GET_DETE: _decode_detection,
+    }
 
     def set_depth(self, depth: float, add: bool = False) -> None:
-        old_depth = self.control["stable"]["depth"]
+        stable = self.control.stable
         if add:
-            self.control["stable"]["depth"] += depth
+            stable.depth += depth
         else:
-            self.control["stable"]["depth"] = depth
-        if old_depth != self.control["stable"]["depth"]:
-            self._okon_client.send(
-                PacketType.SET_STABLE,
-                PacketFlag.DO_NOT_LOG_PACKET,
-                json.dumps(self.control["stable"]),
-            )
+            stable.depth = depth
+        self._send_stable()
 
     def set_stable_vel(self, x: float = None, y: float = None, z: float = None) -> None:
+        stable = self.control.stable
         if x is not None:
-            self.control["stable"]["vel"]["x"] = x
+            stable.vel.x = x
         if y is not None:
-            self.control["stable"]["vel"]["y"] = y
+            stable.vel.y = y
         if z is not None:
-            self.control["stable"]["vel"]["z"] = z
-        self._okon_client.send(
-            PacketType.SET_STABLE,
-            PacketFlag.DO_NOT_LOG_PACKET,
-            json.dumps(self.control["stable"]),
+            stable.vel.z = z
+        self._send_stable()
+
+    def _send_stable(self) -> None:
+        """Sends the stable mode setpoint, JSON is cached until the setpoint changes"""
+        stable = self._control.stable
+        key = (stable.rot.x, stable.rot.y, stable.rot.z, stable.vel.x, stable.vel.y, stable.vel.z, stable.depth)
+        if key != self._stable_key:
+            self._stable_key = key
+            self._stable_json = json.dumps(stable.to_dict())
+        self._okon_client.send_setpoint(
+            PacketType.SET_STABLE, PacketFlag.DO_NOT_LOG_PACKET, self._stable_json, self.stamp
         )
 
     def arm_motors(self) -> None:
-        self._okon_client.send(PacketType.ARM_MTR, PacketFlag.NONE)
+        self._okon_client.send(PacketType.ARM_MTR, PacketFlag.NONE, stamp=self.stamp)
 
     def disarm_motors(self) -> None:
-        self._okon_client.send(PacketType.DISARM_MTR, PacketFlag.NONE)
+        self._okon_client.send(PacketType.DISARM_MTR, PacketFlag.NONE, stamp=self.stamp)
 
     def setMode(self, mode: str) -> None:
-        self.control["mode"] = mode
-        self._okon_client.send(PacketType.SET_CONTROL_MODE, PacketFlag.NONE, mode)
+        self.control.mode = mode
+        self._okon_client.send(PacketType.SET_CONTROL_MODE, PacketFlag.NONE, mode, self.stamp)
 
     def reachedTargetRotation(self, delta):
+        target = self.control.stable.rot
+        rot = self.sens.imu.rot
         return (
-            angle_difference(self.control["stable"]["rot"]["x"], self.sens["imu"]["rot"]["x"]) < delta
-            and angle_difference(self.control["stable"]["rot"]["y"], self.sens["imu"]["rot"]["y"]) < delta
-            and angle_difference(self.control["stable"]["rot"]["z"], self.sens["imu"]["rot"]["z"]) < delta
+            angle_difference(target.x, rot.x) < delta
+            and angle_difference(target.y, rot.y) < delta
+            and angle_difference(target.z, rot.z) < delta
         )
 
     def reachedTargetDepth(self, delta):
-        return abs(self.control["stable"]["depth"] - self.sens["baro"] / 1000 / 9.81) < delta
+        return abs(self.control.stable.depth - self.sens.baro / 1000 / 9.81) < delta
 
-    def get_detection(self, className: str):
-        return list(
-            filter(
-                lambda d: d["className"] == className and d["visibleInFrame"],
-                self.sens["detection"],
-            )
-        )
+    def get_detection(self, className: str) -> list:
+        """Visible detections of className sorted by distance (nearest first), the list must not be modified"""
+        return self.detections.get(className)
 
     def set_stable_rot(self, x: float = None, y: float = None, z: float = None, add=False) -> None:
+        stable = self.control.stable
+        rot = stable.rot
         if x is not None:
             if add:
-                self.control["stable"]["rot"]["x"] += x
+                rot.x += x
             else:
-                self.control["stable"]["rot"]["x"] = x
+                rot.x = x
         if y is not None:
             if add:
-                self.control["stable"]["rot"]["y"] += y
+                rot.y += y
             else:
-                self.control["stable"]["rot"]["y"] = y
+                rot.y = y
         if z is not None:
             if add:
-                self.control["stable"]["rot"]["z"] += z
+                rot.z += z
             else:
-                self.control["stable"]["rot"]["z"] = z
-        self.control["stable"]["rot"] = angle_norm(self.control["stable"]["rot"])
-        self._okon_client.send(
-            PacketType.SET_STABLE,
-            PacketFlag.DO_NOT_LOG_PACKET,
-            json.dumps(self.control["stable"]),
-        )
+                rot.z = z
+        rot.update(angle_norm(rot))
+        self._send_stable()
+
+
+def default_poll_intervals(sync_interval: float = 0.05) -> dict:
+    """Polling intervals [s] of sync requests, rarely changing PIDs and control mode are polled once a second"""
+    return {
+        PacketType.GET_SENS: sync_interval / 2,
+        PacketType.SET_ORIEN: sync_interval,
+        PacketType.GET_DETE: sync_interval,
+        PacketType.SET_STABLE: sync_interval,
+        PacketType.SET_PID: max(sync_interval, 1.0),
+        PacketType.SET_CONTROL_MODE: max(sync_interval, 1.0),
+    }
+
+
+class PollPlan:
+    """Schedules sync requests of every packet type at its own interval.
+
+    In adaptive mode the interval of a packet type is doubled (up to max_interval)
+    every time the server answers with unchanged data and reset when the data changes.
+    The plan is used by the sync and receive threads, set_interval() may be called from any thread.
+    """
+
+    def __init__(self, intervals: dict, adaptive: bool = False, max_interval: float = 1.0) -> None:
+        self.intervals = dict(intervals)  # configured intervals
+        self.adaptive = adaptive
+        self.max_interval = max_interval
+        self._current = dict(intervals)  # intervals after adaptive back off
+        self._next = dict()
+        self._last_crc = dict()
+        self._lock = Lock()
+        self.start(time.monotonic())
+
+    def start(self, now: float) -> None:
+        """Schedules first requests of all packet types at now"""
+        with self._lock:
+            self._next = {packet_type: now for packet_type in self.intervals}
+        self.reset_stats()
+
+    def set_interval(self, packet_type: int, interval: float) -> None:
+        """Adds packet_type to the plan or changes its interval, the next request is sent right away"""
+        with self._lock:
+            for counters in (self._requests, self._replies, self._bytes):
+                counters.setdefault(packet_type, 0)
+            self._current[packet_type] = interval
+            self.intervals[packet_type] = interval
+            self._next[packet_type] = time.monotonic()
+
+    def next_time(self) -> float:
+        """Monotonic time of the next due request"""
+        with self._lock:
+            return min(self._next.values(), default=float("inf"))
+
+    def due(self, now: float) -> list:
+        """Returns packet types due at now and schedules their next requests"""
+        due = []
+        with self._lock:
+            for packet_type, next_time in self._next.items():
+                if next_time <= now:
+                    due.append(packet_type)
+                    next_time += self._current[packet_type]
+                    if next_time <= now:  # skip missed requests instead of bursting them
+                        next_time = now + self._current[packet_type]
+                    self._next[packet_type] = next_time
+                    self._requests[packet_type] += 1
+        return due
+
+    def received(self, packet_type: int, data) -> None:
+        with self._lock:
+            self._replies[packet_type] += 1
+            self._bytes[packet_type] += len(data)
+            if self.adaptive:
+                crc = zlib.crc32(data)
+                if self._last_crc.get(packet_type) == crc:
+                    self._current[packet_type] = min(
+                        2 * self._current[packet_type], max(self.intervals[packet_type], self.max_interval)
+                    )
+                elif self._current[packet_type] != self.intervals[packet_type]:
+                    self._current[packet_type] = self.intervals[packet_type]
+                    self._next[packet_type] = min(
+                        self._next[packet_type], time.monotonic() + self._current[packet_type]
+                    )
+                self._last_crc[packet_type] = crc
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats_start = time.monotonic()
+            self._requests = {packet_type: 0 for packet_type in self.intervals}
+            self._replies = {packet_type: 0 for packet_type in self.intervals}
+            self._bytes = {packet_type: 0 for packet_type in self.intervals}
+
+    def get_stats(self) -> dict:
+        """Effective request/reply rates [1/s] and received bytes per second of every polled packet type"""
+        elapsed = max(time.monotonic() - self._stats_start, 1e-9)
+        with self._lock:
+            return {
+                PacketType.get(packet_type): {
+                    "interval": self._current[packet_type],
+                    "request_rate": self._requests[packet_type] / elapsed,
+                    "reply_rate": self._replies[packet_type] / elapsed,
+                    "bytes_per_second": self._bytes[packet_type] / elapsed,
+                }
+                for packet_type in self.intervals
+            }
 
 
 class Simulation:
-    def __init__(self, okon_client) -> None:
+    def __init__(self, okon_client, poll_plan: PollPlan = None) -> None:
         self._okon_client = okon_client
         self.checkpoints = None  # got from the server
+        self.poll_plan = poll_plan if poll_plan is not None else PollPlan(default_poll_intervals())
 
     def reset(self) -> None:
         self._okon_client.send(PacketType.RST_SIM)
 
     def sync(self) -> None:
+        """Requests all synced data at once"""
         self._okon_client.send(PacketType.SET_ORIEN, PacketFlag.DO_NOT_LOG_PACKET)
         self._okon_client.send(PacketType.GET_SENS, PacketFlag.DO_NOT_LOG_PACKET)
         self._okon_client.send(PacketType.SET_PID, PacketFlag.DO_NOT_LOG_PACKET)
@@ -193,6 +449,217 @@ class Simulation:
         self._okon_client.send(PacketType.SET_STABLE, PacketFlag.DO_NOT_LOG_PACKET)
         self._okon_client.send(PacketType.GET_DETE, PacketFlag.DO_NOT_LOG_PACKET)
 
+    def poll(self, now: float) -> None:
+        """Requests data of packet types due at now according to poll_plan"""
+        for packet_type in self.poll_plan.due(now):
+            if packet_type == PacketType.PING:
+                self._okon_client.ping(now)
+            else:
+                self._okon_client.send(packet_type, PacketFlag.DO_NOT_LOG_PACKET)
+
+
+PACKET_HEADER = struct.Struct("<BBI")  # packet type, packet flag, data length
+IOV_MAX = 1024  # max number of buffers passed to a single sendmsg call
+RECV_BUFFER_SIZE = 1 << 16  # initial size of the receive buffer, it grows to fit the largest packet
+
+
+def pack_packet(packet_type: int, packet_flag: int = PacketFlag.NONE, data_bytes: bytes = b"") -> bytes:
+    """Frames a packet (header and data) into a single buffer ready to be written to the socket"""
+    return PACKET_HEADER.pack(packet_type, packet_flag, len(data_bytes)) + data_bytes
+
+
+if orjson is None:
+
+    def decode_json(data) -> object:
+        """Decodes JSON straight from bytes or memoryview slice"""
+        return json.loads(str(data, "utf-8"))
+
+else:
+
+    def decode_json(data) -> object:
+        """Decodes JSON straight from bytes or memoryview slice"""
+        return orjson.loads(data)
+
+
+class PacketReader:
+    """Receives packets into a reusable growable buffer.
+
+    Data of packets yielded by packets() are memoryview slices of the buffer,
+    they are valid only until the next recv() call. Copy them to keep them longer.
+    """
+
+    def __init__(self, size: int = RECV_BUFFER_SIZE) -> None:
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        self._start = 0  # first byte of unparsed data
+        self._end = 0  # end of received data
+
+    def recv(self, sock: socket.socket) -> int:
+        """Receives as much as available with one recv_into call, returns number of bytes received"""
+        self._make_room()
+        n = sock.recv_into(self._view[self._end :])
+        self._end += n
+        return n
+
+    def packets(self):
+        """Yields (packet_type, packet_flag, data) of every complete packet in the buffer"""
+        while self._end - self._start >= PACKET_HEADER.size:
+            packet_type, packet_flag, length = PACKET_HEADER.unpack_from(self._buffer, self._start)
+            data_start = self._start + PACKET_HEADER.size
+            if data_start + length > self._end:
+                return
+            self._start = data_start + length
+            yield packet_type, packet_flag, self._view[data_start : self._start]
+
+    def _make_room(self) -> None:
+        start, end = self._start, self._end
+        if start == end:
+            self._start = self._end = 0
+            return
+        needed = PACKET_HEADER.size
+        if end - start >= PACKET_HEADER.size:
+            needed += PACKET_HEADER.unpack_from(self._buffer, start)[2]
+        if start + needed <= len(self._buffer):
+            return  # pending packet fits in place
+        if needed <= len(self._buffer):  # move pending data to the front
+            self._buffer[: end - start] = self._buffer[start:end]
+        else:  # views may still be exported, so the buffer is replaced instead of resized
+            buffer = bytearray(max(needed, 2 * len(self._buffer)))
+            buffer[: end - start] = self._buffer[start:end]
+            self._buffer = buffer
+            self._view = memoryview(buffer)
+        self._start, self._end = 0, end - start
+
+
+class SendPolicy:
+    SAFETY = "safety"  # never dropped, sent before all other queued packets
+    SYNC = "sync"  # request without data, not queued again while the same request is queued
+    SETPOINT = "setpoint"  # only the newest value of a queued setpoint of the same type is kept
+    NORMAL = "normal"  # kept in order, the oldest ones are dropped first when the queue is full
+
+
+SAFETY_PACKETS = frozenset((PacketType.ARM_MTR, PacketType.DISARM_MTR))
+SETPOINT_PACKETS = frozenset(
+    (
+        PacketType.SET_MTR,
+        PacketType.SET_CONTROL_MODE,
+        PacketType.SET_ACRO,
+        PacketType.SET_STABLE,
+        PacketType.SET_PID,
+        PacketType.SET_ORIEN,
+    )
+)
+
+
+def send_policy(packet_type: int, data_bytes: bytes) -> str:
+    if packet_type in SAFETY_PACKETS:
+        return SendPolicy.SAFETY
+    if not data_bytes:
+        return SendPolicy.SYNC
+    if packet_type in SETPOINT_PACKETS:
+        return SendPolicy.SETPOINT
+    return SendPolicy.NORMAL
+
+
+class OutboundQueue:
+    """Bounded queue of packets waiting for the sync thread.
+
+    Entries are [packet_type, packet_flag, frame, queued_time, stamp, ...] lists. When max_size packets
+    are queued, the oldest packet which is not a safety one or a setpoint is dropped for a new packet.
+    Safety packets and setpoints (at most one per type and flag) are queued even over max_size,
+    so a setpoint recorded as sent by OkonClient.flush_setpoints() is never lost.
+    """
+
+    def __init__(self, max_size: int = 256) -> None:
+        self.max_size = max_size
+        self._safety = deque()
+        self._queue = deque()
+        self._keys = dict()  # (policy, packet type, packet flag) -> queued sync request or setpoint entry
+        self._condition = Condition()
+        self._wake_up = False
+        self.max_depth = 0
+        self.dropped = dict()  # packet type name -> number of dropped packets
+        self.deduplicated = 0  # sync requests not queued, because the same one was queued
+        self.replaced = 0  # queued setpoints replaced by newer ones
+
+    def put(self, entry: list, policy: str = SendPolicy.NORMAL) -> list:
+        """Queues entry, returns the queued entry which carries its packet (an older one if merged into it)"""
+        with self._condition:
+            if policy == SendPolicy.SAFETY:
+                self._safety.append(entry)
+                if len(self._safety) + len(self._queue) > self.max_size:
+                    self._drop_oldest()
+            else:
+                key = (policy, entry[0], entry[1]) if policy != SendPolicy.NORMAL else None
+                queued = self._keys.get(key) if key is not None else None
+                if queued is not None:
+                    if policy == SendPolicy.SYNC:
+                        self.deduplicated += 1
+                        return queued
+                    queued[2:5] = entry[2:5]  # newest setpoint value in the place of the queued one
+                    self.replaced += 1
+                    return queued
+                if len(self._safety) + len(self._queue) >= self.max_size:
+                    self._drop_oldest()
+                self._queue.append(entry)
+                if key is not None:
+                    self._keys[key] = entry
+            self.max_depth = max(self.max_depth, len(self._safety) + len(self._queue))
+            self._notify()
+            return entry
+
+    def _drop_oldest(self) -> None:
+        for i, entry in enumerate(self._queue):
+            if self._keys.get((SendPolicy.SETPOINT, entry[0], entry[1])) is not entry:
+                del self._queue[i]
+                self._forget(entry)
+                name = PacketType.get(entry[0]) or entry[0]
+                self.dropped[name] = self.dropped.get(name, 0) + 1
+                self._discard(entry)
+                return
+
+    def _forget(self, entry: list) -> None:
+        for key in [key for key, queued in self._keys.items() if queued is entry]:
+            del self._keys[key]
+
+    def _notify(self) -> None:
+        """Wakes up the consumer, called with the lock held"""
+        self._condition.notify()
+
+    def _discard(self, entry: list) -> None:
+        """Called for every dropped entry"""
+
+    def wake_up(self) -> None:
+        """Makes a waiting get_all() return (with no packets if none are queued)"""
+        with self._condition:
+            self._wake_up = True
+            self._notify()
+
+    def get_all(self, timeout: float = None) -> list:
+        """Waits up to timeout [s] for packets and returns all queued ones, safety packets first"""
+        with self._condition:
+            if not self._safety and not self._queue and not self._wake_up:
+                self._condition.wait(timeout)
+            self._wake_up = False
+            packets = list(self._safety)
+            packets.extend(self._queue)
+            self._safety.clear()
+            self._queue.clear()
+            self._keys.clear()
+            return packets
+
+    def depth(self) -> int:
+        return len(self._safety) + len(self._queue)
+
+    def get_stats(self) -> dict:
+        return {
+            "depth": self.depth(),
+            "max_depth": self.max_depth,
+            "dropped": dict(self.dropped),
+            "deduplicated": self.deduplicated,
+            "replaced": self.replaced,
+        }
+
 
 def angle_difference(angle1: float, angle2: float) -> float:
     diff = abs(((angle1 + 360) % 360) - ((angle2 + 360) % 360))
@@ -219,25 +686,103 @@ def angle_norm(a: dict) -> dict:
 
 
 class OkonClient:
-    def __init__(self, ip, port, options=None, sync_interval=0.05, debug=True) -> None:
+    def __init__(
+        self,
+        ip,
+        port,
+        options=None,
+        sync_interval=0.05,
+        debug=True,
+        nodelay=True,
+        poll_intervals: dict = None,
+        adaptive_polling: bool = False,
+        event_workers: int = 2,
+        event_queue_size: int = 256,
+        event_overflow: str = Overflow.DROP_OLDEST,
+        setpoint_window: float = 0.005,
+        ping_interval: float = 0.5,
+        ping_window: int = 256,
+        send_queue_size: int = 256,
+    ) -> None:
+        if poll_intervals is None:
+            poll_intervals = default_poll_intervals(sync_interval)
+        if ping_interval:  # RTT and clock offset are measured by PINGs polled with the synced data
+            poll_intervals = {**poll_intervals, PacketType.PING: ping_interval}
+        self.latency_monitor = LatencyMonitor(ping_window)
         self.okon = Okon(self)
-        self.simulation = Simulation(self)
+        self.simulation = Simulation(self, PollPlan(poll_intervals, adaptive=adaptive_polling))
 
         self.ip = ip
         self.port = port
         self.debug = debug
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.nodelay = nodelay
+        self.socket = None
         self.connected = False
         self._events = dict()
-        self.syncTime = time.time()
+        self._inline_events = dict()
+        self._event_dispatcher = EventDispatcher(event_workers, event_queue_size, event_overflow)
+        self._frame_consumers = dict()
+        self._packet_handlers = dict.fromkeys(Okon._DECODERS, self._handle_state_packet)
+        self._packet_handlers.update(
+            dict.fromkeys(
+                (
+                    PacketType.ARM_MTR,
+                    PacketType.DISARM_MTR,
+                    PacketType.GET_DEPTH,
+                    PacketType.GET_DEPTH_BYTES,
+                    PacketType.GET_VIDEO_BYTES,
+                    PacketType.GET_VIDEO,
+                    PacketType.SET_SIM,
+                    PacketType.ACK,
+                    PacketType.CHK_AP,
+                    PacketType.REC_STRT,
+                    PacketType.REC_ST,
+                    PacketType.REC_RST,
+                    PacketType.GET_REC,
+                ),
+                self._handle_ignored_packet,
+            )
+        )
+        self._packet_handlers.update(
+            {
+                PacketType.GET_DETE: self._handle_detection_packet,
+                PacketType.RST_SIM: self._handle_rst_sim,
+                PacketType.PING: self._handle_ping,
+                PacketType.GET_CPS: self._handle_checkpoints,
+                PacketType.HIT_NGZ: self._handle_hit_ngz,
+                PacketType.HIT_FZ: self._handle_hit_fz,
+                PacketType.ERROR: self._handle_error,
+            }
+        )
+        self.syncTime = time.monotonic()  # time of the last sync
         self.sync_interval = sync_interval
-        self._to_send = Queue()
+        self._to_send = OutboundQueue(send_queue_size)
+        self.sync_jitter = RollingStats()  # delay of sync requests after their scheduled time [s]
+        self.queue_latency = RollingStats()  # time from send() to writing the packet to the socket [s]
+        self.setpoint_window = setpoint_window  # setpoints set within the window are sent as one packet [s]
+        self._setpoints = dict()  # packet type -> (packet flag, payload) of the newest not sent setpoint
+        self._sent_setpoints = dict()  # packet type -> payload of the last sent setpoint
+        self._setpoint_deadline = None  # when queued setpoints have to be flushed
+        self._setpoint_lock = Lock()
+        self.setpoint_stats = {"requested": 0, "sent": 0, "coalesced": 0, "suppressed": 0}
+        # latency [s] of packets sent with a causal stamp: receiving the state they were decided on -> tick
+        # of the tree (freeze) -> queuing by an Okon setter -> writing to the socket
+        self.latency = {
+            "receive_to_tick": RollingStats(),
+            "tick_to_enqueue": RollingStats(),
+            "enqueue_to_wire": RollingStats(),
+            "receive_to_wire": RollingStats(),
+        }
+        self.recorder = None
 
     def connect(self) -> bool:
         if self.debug:
             print(f"Connecting to {self.ip}:{self.port}")
         try:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.connect((self.ip, self.port))
+            self.set_nodelay(self.nodelay)
+            self._sent_setpoints.clear()
             self.connected = True
             comm_thread = Thread(target=self._comm_thread)
             sync_thread = Thread(target=self._sync_thread)
@@ -250,140 +795,269 @@ class OkonClient:
             print(f"failed to connect {err}")
             return False
 
-    def send(self, packet_type: int, packet_flag: int = PacketFlag.NONE, json: str = None) -> None:
-        if json == None:
-            self._to_send.put((packet_type, packet_flag, 0))
-        else:
-            json_bytes = json.encode()
-            self._to_send.put((packet_type, packet_flag, len(json_bytes), json_bytes))
+    def set_nodelay(self, enabled: bool = True) -> None:
+        """Enables/disables TCP_NODELAY (Nagle's algorithm is disabled when enabled)"""
+        self.nodelay = enabled
+        if self.socket is not None:
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(enabled))
+
+    def send(self, packet_type: int, packet_flag: int = PacketFlag.NONE, json: str = None, stamp: tuple = None) -> None:
+        """Queues a packet, stamp is the causal stamp (Okon.stamp) of the state the packet was decided on"""
+        data_bytes = b"" if json is None else json.encode()
+        frame = pack_packet(packet_type, packet_flag, data_bytes)
+        now = time.monotonic()
+        if stamp is not None and len(stamp) == 3:
+            stamp = (*stamp, now)
+        self._to_send.put([packet_type, packet_flag, frame, now, stamp], send_policy(packet_type, data_bytes))
+
+    def ping(self, now: float = None) -> None:
+        """Sends a PING of latency_monitor, replies are not emitted as "ping" events"""
+        self.send(PacketType.PING, PacketFlag.DO_NOT_LOG_PACKET, self.latency_monitor.request(now))
+
+    def start_recording(self, path: str) -> None:
+        """Starts recording all sent and received packets to a telemetry log at path"""
+        self.stop_recording()
+        self.recorder = TelemetryRecorder(path)
+
+    def stop_recording(self) -> None:
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+
+    def send_setpoint(self, packet_type: int, packet_flag: int, json: str, stamp: tuple = None) -> None:
+        """Queues a setpoint packet, within setpoint_window only the newest setpoint of packet_type is sent.
+
+        Setpoints equal to the last sent one of the same packet type are not sent at all.
+        The causal stamp of the sent setpoint is the one of its newest request.
+        """
+        if stamp is not None:
+            stamp = (*stamp, time.monotonic())
+        with self._setpoint_lock:
+            self.setpoint_stats["requested"] += 1
+            if packet_type in self._setpoints:
+                self.setpoint_stats["coalesced"] += 1
+            self._setpoints[packet_type] = (packet_flag, json, stamp)
+            if self._setpoint_deadline is None:
+                self._setpoint_deadline = time.monotonic() + self.setpoint_window
+                self._schedule_setpoint_flush()
+
+    def flush_setpoints(self) -> None:
+        """Sends queued setpoints immediately (e.g. at the end of a behavior tree tick)"""
+        with self._setpoint_lock:
+            setpoints = self._setpoints
+            self._setpoints = dict()
+            self._setpoint_deadline = None
+            for packet_type, (packet_flag, json, stamp) in setpoints.items():
+                if self._sent_setpoints.get(packet_type) == json:
+                    self.setpoint_stats["suppressed"] += 1
+                    continue
+                self._sent_setpoints[packet_type] = json
+                self.setpoint_stats["sent"] += 1
+                self.send(packet_type, packet_flag, json, stamp)
+
+    def _schedule_setpoint_flush(self) -> None:
+        self._to_send.wake_up()  # the sync thread flushes setpoints at _setpoint_deadline
+
+    def get_stats(self) -> dict:
+        return {
+            "sync_jitter": self.sync_jitter.summary(),
+            "queue_latency": self.queue_latency.summary(),
+            "polling": self.simulation.poll_plan.get_stats(),
+            "events": self._event_dispatcher.get_stats(),
+            "setpoints": dict(
+                self.setpoint_stats, saved=self.setpoint_stats["coalesced"] + self.setpoint_stats["suppressed"]
+            ),
+            "latency": {name: stats.summary() for name, stats in self.latency.items()},
+            "ping": self.latency_monitor.summary(),
+            "send_queue": self.send_queue_stats(),
+        }
+
+    def send_queue_stats(self) -> dict:
+        """Depth of the outbound queue, max depth and numbers of dropped, deduplicated and replaced packets"""
+        return self._to_send.get_stats()
+
+    def _trace_latency(self, stamp: tuple, sent_time: float) -> None:
+        """Adds latencies of a packet sent at sent_time with causal stamp (seq, received, ticked, enqueued)"""
+        seq, received, ticked, enqueued = stamp
+        if seq == 0:  # decided before any state was received
+            return
+        if ticked is None:  # sent outside of a tick, the decision was made when it was queued
+            ticked = enqueued
+        self.latency["receive_to_tick"].add(ticked - received)
+        self.latency["tick_to_enqueue"].add(enqueued - ticked)
+        self.latency["enqueue_to_wire"].add(sent_time - enqueued)
+        self.latency["receive_to_wire"].add(sent_time - received)
 
     def _sync_thread(self) -> None:
+        """Sends queued packets as soon as they are queued and polls the server according to the poll plan"""
+        poll_plan = self.simulation.poll_plan
+        poll_plan.start(time.monotonic())
         while self.connected:
-            while not self._to_send.empty():
-                packet = self._to_send.get()
-                self._send(packet)
+            now = time.monotonic()
+            if self._setpoint_deadline is not None and self._setpoint_deadline <= now:
+                self.flush_setpoints()
+            next_sync = poll_plan.next_time()
+            if next_sync <= now:
+                self.syncTime = now
+                self.sync_jitter.add(now - next_sync)
+                self.simulation.poll(now)
+                continue
+            timeout = min(next_sync, self._setpoint_deadline or next_sync, now + 1.0) - now
+            packets = self._to_send.get_all(timeout)
+            if not packets:  # timeout or wake up
+                continue
+            try:
+                self._send(packets)
+            except OSError:
+                if not self.connected:
+                    break  # socket closed by disconnect()
+                raise
+            sent_time = time.monotonic()
+            for packet in packets:
+                self.queue_latency.add(sent_time - packet[3])
+                if packet[4] is not None:
+                    self._trace_latency(packet[4], sent_time)
 
-            if time.time() > self.syncTime + self.sync_interval:
-                self.syncTime = time.time()
-                self.simulation.sync()
-            else:
-                time.sleep(0.001)  # avg ping ~2.7ms
-
-    def _send(self, packet: tuple) -> None:
-        self.socket.sendall(packet[0].to_bytes(1, byteorder="little"))
-        self.socket.sendall(packet[1].to_bytes(1, byteorder="little"))
-        self.socket.sendall(packet[2].to_bytes(4, byteorder="little"))
-        if packet[2] > 0:
-            self.socket.sendall(packet[3])
-            if self.debug and packet[1] & PacketFlag.DO_NOT_LOG_PACKET == 0:
-                print(f'SENT {PacketType.get(packet[0])} {PacketFlag.get(packet[1])} dat:{packet[3].decode("utf-8") }')
-        else:
-            if self.debug and packet[1] & PacketFlag.DO_NOT_LOG_PACKET == 0:
-                print(f"SENT {PacketType.get(packet[0])} {PacketFlag.get(packet[1])}")
+    def _send(self, packets: list) -> None:
+        """Writes all queued packets to the socket using one vectored write (if available)"""
+        buffers = [packet[2] for packet in packets]
+        if hasattr(self.socket, "sendmsg"):
+            self._sendmsg_all(buffers)
+        else:  # no scatter-gather on Windows
+            self.socket.sendall(b"".join(buffers))
+        recorder = self.recorder  # stop_recording() may reset it meanwhile
+        if recorder is not None:
+            self._record_sent(recorder, packets)
+        if self.debug:
+            self._log_sent(packets)
+
+    def _record_sent(self, recorder: TelemetryRecorder, packets: list) -> None:
+        for packet_type, packet_flag, frame, *_ in packets:
+            recorder.record(SENT, packet_type, packet_flag, memoryview(frame)[PACKET_HEADER.size :])
+
+    def _log_sent(self, packets: list) -> None:
+        for packet_type, packet_flag, frame, *_ in packets:
+            if packet_flag & PacketFlag.DO_NOT_LOG_PACKET == 0:
+                if len(frame) > PACKET_HEADER.size:
+                    data = frame[PACKET_HEADER.size :].decode("utf-8")
+                    print(f"SENT {PacketType.get(packet_type)} {PacketFlag.get(packet_flag)} dat:{data}")
+                else:
+                    print(f"SENT {PacketType.get(packet_type)} {PacketFlag.get(packet_flag)}")
 
-    def _receiveAll(self, n: int) -> bytes:
-        buffer = b""
-        while len(buffer) != n:
-            buffer += self.socket.recv(n - len(buffer))
-        return buffer
+    def _sendmsg_all(self, buffers: list) -> None:
+        i = 0
+        while i < len(buffers):
+            sent = self.socket.sendmsg(buffers[i : i + IOV_MAX])
+            while sent > 0:  # skip fully written buffers, trim a partially written one
+                if sent >= len(buffers[i]):
+                    sent -= len(buffers[i])
+                    i += 1
+                else:
+                    buffers[i] = memoryview(buffers[i])[sent:]
+                    sent = 0
 
     def _comm_thread(self) -> None:
+        reader = PacketReader()
         while self.connected:
-            packet_typeFlag = self._receiveAll(2)
-            dataLength = int.from_bytes(self._receiveAll(4), "little")
-            data_bytes = self._receiveAll(dataLength)
-            self._handle_packet(packet_typeFlag[0], packet_typeFlag[1], data_bytes)
+            try:
+                if reader.recv(self.socket) == 0:
+                    break  # connection closed by the server
+            except ConnectionError:
+                break  # connection reset by the server
+            except OSError:
+                if not self.connected:
+                    break  # socket closed by disconnect()
+                raise
+            for packet_type, packet_flag, data in reader.packets():
+                self._handle_packet(packet_type, packet_flag, data)
+        if self.connected:
+            self.disconnect()
 
-    def _handle_packet(self, packet_type: int, packet_flag: int, data_bytes: bytes):
+    def _handle_packet(self, packet_type: int, packet_flag: int, data: memoryview):
+        """Handles a received packet, data is a view of the receive buffer valid only during the call"""
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record(RECEIVED, packet_type, packet_flag, data)
         if self.debug and packet_flag & PacketFlag.DO_NOT_LOG_PACKET == 0:
             print(
-                f'RECV {PacketType.get(packet_type)} {PacketFlag.get(packet_flag)} len:{len(data_bytes)} {data_bytes.decode("utf-8")[:40]}'
+                f'RECV {PacketType.get(packet_type)} {PacketFlag.get(packet_flag)} len:{len(data)} {str(data[:160], "utf-8", "replace")[:40]}'
             )
-        if packet_type == PacketType.SET_MTR:
-            manual = json.loads(data_bytes.decode())
-            self.okon.control["manual"] = manual
-        elif packet_type == PacketType.ARM_MTR:
-            pass
-        elif packet_type == PacketType.DISARM_MTR:
-            pass
-        elif packet_type == PacketType.SET_CONTROL_MODE:
-            self.okon.control["mode"] = data_bytes.decode()
-        elif packet_type == PacketType.SET_ACRO:
-            acro = json.loads(data_bytes.decode())
-            self.okon.control["acro"] = acro
-        elif packet_type == PacketType.SET_STABLE:
-            stable = json.loads(data_bytes.decode())
-            self.okon.control["stable"] = stable
-        elif packet_type == PacketType.SET_PID:
-            pids = json.loads(data_bytes.decode())
-            self.okon.pids = pids
-        elif packet_type == PacketType.GET_SENS:
-            sens = json.loads(data_bytes.decode())
-            sens["rot "] = angle_norm(sens["rot"])
-            self.okon.sens["baro"] = sens["baro"]["pressure"]
-            self.okon.sens["imu"] = sens
-        elif packet_type == PacketType.GET_DEPTH:
-            pass
-        elif packet_type == PacketType.GET_DEPTH_BYTES:
-            pass
-        elif packet_type == PacketType.GET_VIDEO_BYTES:
-            pass
-        elif packet_type == PacketType.GET_VIDEO:
-            pass
-        elif packet_type == PacketType.SET_SIM:
-            pass
-        elif packet_type == PacketType.ACK:
-            pass
-        elif packet_type == PacketType.SET_ORIEN:
-            orien = json.loads(data_bytes.decode())
-            self.okon.orien["pos"] = orien["pos"]
-            self.okon.orien["rot"] = angle_norm(orien["rot"])
-        elif packet_type == PacketType.RST_SIM:
-            self._emit_event("simRST")
-        elif packet_type == PacketType.PING:
-            self._emit_event("ping", data_bytes.decode())
-        elif packet_type == PacketType.GET_CPS:
-            checkpoints = json.loads(data_bytes.decode())
-            self.simulation.checkpoints = checkpoints
-        elif packet_type == PacketType.HIT_NGZ:
-            ngz = json.loads(data_bytes.decode())
-            self._emit_event("hitNGZ", ngz["id"])
-        elif packet_type == PacketType.HIT_FZ:
-            fz = json.loads(data_bytes.decode())
-            self._emit_event("hitFZ", fz["id"])
-        elif packet_type == PacketType.CHK_AP:
-            pass
-        elif packet_type == PacketType.ERROR:
-            error = json.loads(data_bytes.decode())
-            self._emit_event("error", error)
-        elif packet_type == PacketType.REC_STRT:
-            pass
-        elif packet_type == PacketType.REC_ST:
-            pass
-        elif packet_type == PacketType.REC_RST:
-            pass
-        elif packet_type == PacketType.GET_REC:
-            pass
-        elif packet_type == PacketType.GET_DETE:
-            self.okon.sens["detection"] = json.loads(data_bytes.decode())
+        if packet_type in self.simulation.poll_plan.intervals:
+            self.simulation.poll_plan.received(packet_type, data)
+        if packet_type in self._frame_consumers:
+            for func in self._frame_consumers[packet_type]:
+                func(data)
+        self._packet_handlers.get(packet_type, self._handle_unknown_packet)(packet_type, packet_flag, data)
+
+    def _handle_state_packet(self, packet_type: int, packet_flag: int, data: memoryview) -> None:
+        self.okon.update(packet_type, data)
+
+    def _handle_detection_packet(self, packet_type: int, packet_flag: int, data: memoryview) -> None:
+        self.okon.update_detection(data)
+
+    def _handle_ignored_packet(self, packet_type: int, packet_flag: int, data: memoryview) -> None:
+        pass
+
+    def _handle_unknown_packet(self, packet_type: int, packet_flag: int, data: memoryview) -> None:
+        self._emit_event("packet", (packet_type, packet_flag, bytes(data)))
+
+    def _handle_rst_sim(self, packet_type: int, packet_flag: int, data: memoryview) -> None:
+        self._sent_setpoints.clear()  # the simulation forgot the setpoints
+        self._emit_event("simRST")
+
+    def _handle_ping(self, packet_type: int, packet_flag: int, data: memoryview) -> None:
+        if data[:1] == LatencyMonitor.PREFIX:
+            self.latency_monitor.reply(data)
         else:
-            self._emit_event("packet", (packet_type, packet_flag, data_bytes))
+            self._emit_event("ping", str(data, "utf-8"))
+
+    def _handle_checkpoints(self, packet_type: int, packet_flag: int, data: memoryview) -> None:
+        self.simulation.checkpoints = decode_json(data)
+
+    def _handle_hit_ngz(self, packet_type: int, packet_flag: int, data: memoryview) -> None:
+        self._emit_event("hitNGZ", decode_json(data)["id"])
+
+    def _handle_hit_fz(self, packet_type: int, packet_flag: int, data: memoryview) -> None:
+        self._emit_event("hitFZ", decode_json(data)["id"])
+
+    def _handle_error(self, packet_type: int, packet_flag: int, data: memoryview) -> None:
+        self._emit_event("error", decode_json(data))
 
     def disconnect(self) -> None:
         self.connected = False
         self.socket.close()
+        self.stop_recording()
         self._emit_event("disconnect")
 
-    def on_event(self, name: str, func) -> None:
-        if name in self._events:
-            self._events[name].append(func)
+    def on_event(self, name: str, func, inline: bool = False) -> None:
+        """Registers func(args) called on each event name.
+
+        Handlers run on a worker pool in the order of events, inline handlers run
+        directly on the emitting thread, so they have to be cheap.
+        """
+        events = self._inline_events if inline else self._events
+        if name in events:
+            events[name].append(func)
         else:
-            self._events[name] = list()
-            self._events[name].append(func)
+            events[name] = list()
+            events[name].append(func)
+
+    def register_packet_handler(self, packet_type: int, func) -> None:
+        """Sets func(packet_type, packet_flag, data) as the handler of packet_type, replacing the current one.
+
+        Handlers are called on the receive thread, data is valid only during the call.
+        """
+        self._packet_handlers[packet_type] = func
+
+    def on_frame(self, packet_type: int, func) -> None:
+        """Registers func(data) called on the receive thread with a zero-copy view of each packet of packet_type.
+
+        The view is valid only during the call, func has to copy the data it keeps and must return quickly.
+        """
+        self._frame_consumers.setdefault(packet_type, []).append(func)
 
     def _emit_event(self, name: str, args=None) -> None:
+        for e in self._inline_events.get(name, ()):
+            e(args)
         if name in self._events:
-            for e in self._events[name]:
-                event_thread = Thread(target=e, args=(args,))
-                event_thread.daemon = True
-                event_thread.start()
+            self._event_dispatcher.dispatch(name, self._events[name], args)
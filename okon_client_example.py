@@ -1,51 +1,35 @@
 import time
 
-from okon_client import OkonClient, PacketFlag, PacketType
+from okon_client import OkonClient, PacketType
 
 
 def handle_simulation_reset(args=None) -> None:
     print("sim resetted")
 
 
-def handle_ping(args=None) -> None:
-    global sum, n
-    cur_ping = round((time.time() - float(args)) * 10000) / 10
-    sum += cur_ping
-    n += 1
-
-
 oc = OkonClient(
-    ip="127.0.0.1", port=44210, sync_interval=0.05, debug=False
+    ip="127.0.0.1", port=44210, sync_interval=0.05, debug=False, ping_interval=0.01
 )  # ping simRST hitNGZ hitFZ packet error disconnect # run on separate thread
 oc.on_event("simRST", handle_simulation_reset)
-oc.on_event("ping", handle_ping)
 okon = oc.okon
 sim = oc.simulation
 
-sum = 0  # ping checking
-n = 0
 if oc.connect():
     sim.reset()
 
-    i = 1000
-    while i > 0:  # ping checking
+    for i in range(1000):  # ping checking, PINGs are pipelined with the synced data every ping_interval
         oc.send(PacketType.GET_VIDEO_BYTES)
-        oc.send(PacketType.PING, PacketFlag.NONE, str(time.time()))
-        time.sleep(0.01)
-        i -= 1
-    print("waiting")
-    while n < 1000:
         time.sleep(0.01)
-    print(f"avg RTT is {sum/n}ms")
+    rtt = oc.latency_monitor.summary()["rtt"]
+    if rtt.get("count"):
+        print(f"RTT min {rtt['min'] * 1000:.1f} ms median {rtt['p50'] * 1000:.1f} ms p99 {rtt['p99'] * 1000:.1f} ms")
+    else:
+        print("RTT - (no ping replies)")
     exit()
 
     okon.disarm_motors()
     okon.set_stable_vel(x=0, y=0, z=0)
 
-    for i in range(5):
-        oc.send(PacketType.PING, PacketFlag.NONE, str(time.time()))
-        time.sleep(0.1)
-
     print("setting pos and depth")
     okon.set_depth(0.6)
     print(okon.sens["baro"] / 1000 / 9.81 + 0.3)
@@ -0,0 +1,93 @@
+"""Depth maps received from OKON (GET_DEPTH_BYTES, GET_DEPTH).
+
+Depth maps are parsed into two preallocated float32 arrays (double buffering):
+a new map is written into the back array, which then becomes the front one,
+so readers of the front array never see a half-written map.
+
+    depth = DepthMap(oc, width=640, height=480)
+    oc.simulation.poll_plan.set_interval(PacketType.GET_DEPTH_BYTES, 0.1)
+    distance, x, y = depth.nearest_obstacle(roi=(0.4, 0.4, 0.6, 0.6))
+"""
+import binascii
+import time
+
+import numpy as np
+
+from okon_client import PacketType
+
+FULL_FRAME = (0.0, 0.0, 1.0, 1.0)  # region of interest (x min, y min, x max, y max) in normalized coordinates
+
+
+def _roi_slices(shape: tuple, roi: tuple) -> tuple:
+    height, width = shape
+    x0, y0, x1, y1 = roi
+    rows = slice(int(y0 * height), max(int(y0 * height) + 1, int(y1 * height)))
+    cols = slice(int(x0 * width), max(int(x0 * width) + 1, int(x1 * width)))
+    return rows, cols
+
+
+def _valid_depth(depth: np.ndarray, min_depth: float) -> np.ndarray:
+    """Depth with invalid values (not finite or not greater than min_depth) replaced by inf"""
+    return np.where(np.isfinite(depth) & (depth > min_depth), depth, np.inf)
+
+
+def nearest_obstacle(depth: np.ndarray, roi: tuple = FULL_FRAME, min_depth: float = 0.0) -> tuple:
+    """Returns (distance, x, y) of the nearest point in roi, x and y are normalized, distance is inf if none"""
+    rows, cols = _roi_slices(depth.shape, roi)
+    region = _valid_depth(depth[rows, cols], min_depth)
+    row, col = np.unravel_index(np.argmin(region), region.shape)
+    height, width = depth.shape
+    return float(region[row, col]), float((cols.start + col + 0.5) / width), float((rows.start + row + 0.5) / height)
+
+
+def column_min_depth(depth: np.ndarray, roi: tuple = FULL_FRAME, bins: int = None, min_depth: float = 0.0):
+    """Returns the minimal depth of every column in roi (inf where there is none).
+
+    With bins, columns are grouped into that many equal sectors (left to right) first.
+    """
+    rows, cols = _roi_slices(depth.shape, roi)
+    columns = _valid_depth(depth[rows, cols], min_depth).min(axis=0)
+    if bins is None:
+        return columns
+    edges = np.linspace(0, len(columns), bins + 1).astype(int)
+    return np.minimum.reduceat(columns, edges[:-1])
+
+
+class DepthMap:
+    """Latest depth map [m] of OKON camera as a height x width float32 array"""
+
+    def __init__(self, okon_client, width: int = 640, height: int = 480, min_depth: float = 0.0) -> None:
+        self.min_depth = min_depth  # depths not greater than min_depth are treated as no data
+        self._buffers = [np.full((height, width), np.inf, dtype=np.float32) for _ in range(2)]
+        self._front = 0
+        self.seq = 0  # sequence number of the current map
+        self.timestamp = 0.0  # monotonic time of receiving the current map
+        self.received = 0
+        self.errors = 0  # maps with unexpected size
+        okon_client.on_frame(PacketType.GET_DEPTH_BYTES, self._on_depth)
+        okon_client.on_frame(PacketType.GET_DEPTH, self._on_base64_depth)
+
+    @property
+    def map(self) -> np.ndarray:
+        """Current depth map, it is valid until the next but one map arrives (copy it to keep it longer)"""
+        return self._buffers[self._front]
+
+    def _on_base64_depth(self, data: memoryview) -> None:
+        self._on_depth(binascii.a2b_base64(data))
+
+    def _on_depth(self, data) -> None:
+        back = self._buffers[1 - self._front]
+        if len(data) != back.nbytes:
+            self.errors += 1
+            return
+        np.copyto(back, np.frombuffer(data, dtype="<f4").reshape(back.shape))
+        self.timestamp = time.monotonic()
+        self.seq += 1
+        self.received += 1
+        self._front = 1 - self._front
+
+    def nearest_obstacle(self, roi: tuple = FULL_FRAME) -> tuple:
+        return nearest_obstacle(self.map, roi, self.min_depth)
+
+    def column_min_depth(self, roi: tuple = FULL_FRAME, bins: int = None):
+        return column_min_depth(self.map, roi, bins, self.min_depth)
@@ -0,0 +1,91 @@
+"""Event dispatching for the OKON client"""
+import time
+from collections import deque
+from threading import Condition, Thread, current_thread
+
+from okon_metrics import RollingStats
+
+
+class Overflow:
+    BLOCK = "block"  # wait for free space in the queue (drop the oldest event when emitted by a worker)
+    DROP_OLDEST = "drop_oldest"  # drop the oldest queued event
+    COALESCE = "coalesce"  # replace a queued event with the same name, drop the oldest if there is none
+
+
+class EventDispatcher:
+    """Runs event handlers on a bounded pool of worker threads.
+
+    All events with the same name are handled by the same worker, so they are handled in emit order.
+    Every worker has a queue of at most max_queue events, overflow decides what happens when it is full.
+    The default never blocks the emitting thread (the client's receive thread), BLOCK is opt-in.
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 256, overflow: str = Overflow.DROP_OLDEST) -> None:
+        self.workers = workers
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self._queues = [deque() for _ in range(workers)]
+        self._conditions = [Condition() for _ in range(workers)]
+        self._threads = [None] * workers
+        self.queue_delay = RollingStats()  # time from emit to the start of handling [s]
+        self.handler_time = RollingStats()  # time spent in handlers of one event [s]
+        self.max_depth = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def dispatch(self, name: str, handlers: list, args=None) -> None:
+        """Queues handling of an event by handlers (called in order with args)"""
+        i = hash(name) % self.workers
+        queue, condition = self._queues[i], self._conditions[i]
+        with condition:
+            if self._threads[i] is None:
+                self._threads[i] = Thread(target=self._worker, args=(queue, condition), daemon=True)
+                self._threads[i].start()
+            if len(queue) >= self.max_queue:
+                if self.overflow == Overflow.BLOCK and current_thread() not in self._threads:
+                    condition.wait_for(lambda: len(queue) < self.max_queue)
+                elif self.overflow == Overflow.COALESCE and self._coalesce(queue, name, handlers, args):
+                    return
+                else:
+                    queue.popleft()
+                    self.dropped += 1
+            queue.append((name, handlers, args, time.monotonic()))
+            self.max_depth = max(self.max_depth, len(queue))
+            condition.notify_all()
+
+    def _coalesce(self, queue: deque, name: str, handlers: list, args) -> bool:
+        for j in range(len(queue) - 1, -1, -1):  # the newest queued event, so the order is kept
+            event = queue[j]
+            if event[0] == name:
+                queue[j] = (name, handlers, args, event[3])
+                self.coalesced += 1
+                return True
+        return False
+
+    def _worker(self, queue: deque, condition: Condition) -> None:
+        while True:
+            with condition:
+                condition.wait_for(lambda: queue)
+                name, handlers, args, emit_time = queue.popleft()
+                condition.notify_all()
+            start = time.monotonic()
+            self.queue_delay.add(start - emit_time)
+            for handler in handlers:
+                try:
+                    handler(args)
+                except Exception as err:
+                    print(f"{name} event handler {handler} failed: {err!r}")
+            self.handler_time.add(time.monotonic() - start)
+
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues)
+
+    def get_stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth(),
+            "max_queue_depth": self.max_depth,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "queue_delay": self.queue_delay.summary(),
+            "handler_time": self.handler_time.summary(),
+        }
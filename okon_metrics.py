@@ -0,0 +1,111 @@
+"""Lightweight metrics used by the OKON client"""
+import time
+from collections import deque
+from threading import Lock
+
+
+class RollingStats:
+    """Keeps the last `size` samples of a measurement and summarizes them on demand"""
+
+    def __init__(self, size: int = 1000) -> None:
+        self.samples = deque(maxlen=size)
+        self.count = 0  # number of all samples ever added
+
+    def add(self, value: float) -> None:
+        self.samples.append(value)
+        self.count += 1
+
+    def percentile(self, p: float) -> float:
+        samples = sorted(self.samples)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(p / 100 * len(samples)))]
+
+    def summary(self) -> dict:
+        samples = sorted(self.samples)
+        if not samples:
+            return {"count": self.count}
+        n = len(samples)
+        return {
+            "count": self.count,
+            "mean": sum(samples) / n,
+            "min": samples[0],
+            "p50": samples[n // 2],
+            "p99": samples[min(n - 1, int(0.99 * n))],
+            "max": samples[-1],
+        }
+
+
+class LatencyMonitor:
+    """Estimates round-trip time and clock offset to the server from pipelined PING packets.
+
+    request() gives the payload of the next PING ("#<seq>"), it is sent without waiting
+    for replies of previous ones. The server echoes the payload, optionally followed by
+    " <server time>". The offset (server clock - local monotonic clock) is taken from the
+    reply with the lowest RTT in the window, where the error bound of RTT / 2 is the smallest.
+    """
+
+    PREFIX = b"#"
+
+    def __init__(self, window: int = 256, timeout: float = 2.0) -> None:
+        self.rtt = RollingStats(window)  # [s]
+        self.timeout = timeout  # requests without a reply for timeout [s] are lost
+        self.sent = 0
+        self.received = 0
+        self.lost = 0
+        self._outstanding = dict()  # seq -> monotonic send time
+        self._offsets = deque(maxlen=window)  # (rtt, offset) of replies with a server time
+        self._lock = Lock()  # requests are sent by the sync thread, replies handled by the receive thread
+
+    def request(self, now: float = None) -> str:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.sent += 1
+            self._outstanding[self.sent] = now
+            if len(self._outstanding) > 1:
+                expired = [seq for seq, sent in self._outstanding.items() if now - sent > self.timeout]
+                for seq in expired:
+                    del self._outstanding[seq]
+                self.lost += len(expired)
+        return f"#{self.sent}"
+
+    def reply(self, data, now: float = None) -> None:
+        """Handles the payload of a PING reply to request()"""
+        now = time.monotonic() if now is None else now
+        fields = bytes(data[1:]).split()
+        try:
+            seq = int(fields[0])
+        except (IndexError, ValueError):  # not a reply to request()
+            return
+        with self._lock:
+            sent = self._outstanding.pop(seq, None)
+            if sent is None:  # already counted as lost
+                return
+            self.received += 1
+        rtt = now - sent
+        self.rtt.add(rtt)
+        if len(fields) > 1:
+            self._offsets.append((rtt, float(fields[1]) - (sent + now) / 2))
+
+    @property
+    def offset(self) -> float:
+        """Server clock minus local monotonic clock [s], None without server timestamps"""
+        offsets = list(self._offsets)
+        return min(offsets)[1] if offsets else None
+
+    def to_local(self, server_time: float) -> float:
+        """Local monotonic time of a server timestamp, None until the offset is known"""
+        offset = self.offset
+        return None if offset is None else server_time - offset
+
+    def summary(self) -> dict:
+        offsets = list(self._offsets)
+        return {
+            "rtt": self.rtt.summary(),
+            "sent": self.sent,
+            "received": self.received,
+            "lost": self.lost,
+            "outstanding": len(self._outstanding),
+            "offset": min(offsets)[1] if offsets else None,
+            "offset_error": min(offsets)[0] / 2 if offsets else None,
+        }
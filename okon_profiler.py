@@ -0,0 +1,198 @@
+"""Opt-in profiling of behaviours of a py_trees tree.
+
+Every initialise, update and terminate call of an attached tree is recorded
+(behaviour, phase, start, duration, status and feedback) into a fixed-size ring
+buffer and counted in per-behaviour latency histograms. Feedback of
+okon_actions.OkonBehaviour is kept unformatted until the trace is viewed.
+Trees which are not attached are not instrumented at all.
+
+    profiler = BehaviourProfiler(capacity=4096)
+    profiler.attach(root)
+    ...
+    print(profiler.format_trace(last=20))
+    profiler.print_histograms()
+    print("\\n".join(profiler.flame()))  # collapsed stacks for flamegraph.pl / speedscope
+    profiler.detach()
+"""
+import time
+from array import array
+
+import py_trees
+
+PHASES = ("initialise", "update", "terminate")
+HISTOGRAM_BUCKETS = 24  # bucket i counts calls shorter than 2**i microseconds, the last one all longer
+
+
+def _path(behaviour: py_trees.behaviour.Behaviour) -> tuple:
+    names = []
+    while behaviour is not None:
+        names.append(behaviour.name)
+        behaviour = behaviour.parent
+    return tuple(reversed(names))
+
+
+class _NodeStats:
+    __slots__ = ("calls", "total", "max", "histograms")
+
+    def __init__(self) -> None:
+        self.calls = [0] * len(PHASES)
+        self.total = [0.0] * len(PHASES)
+        self.max = [0.0] * len(PHASES)
+        self.histograms = [[0] * HISTOGRAM_BUCKETS for _ in PHASES]
+
+
+class BehaviourProfiler:
+    """Records calls of behaviour methods into a ring buffer of the last capacity calls"""
+
+    def __init__(self, capacity: int = 4096) -> None:
+        self.capacity = capacity
+        self._behaviours = [None] * capacity
+        self._phases = array("B", bytes(capacity))
+        self._starts = array("d", bytes(8 * capacity))  # perf_counter time
+        self._durations = array("d", bytes(8 * capacity))  # [s]
+        self._statuses = [None] * capacity
+        self._feedbacks = [None] * capacity  # raw feedback, formatted by format_trace()
+        self.recorded = 0  # number of all recorded calls, the buffer holds the last capacity of them
+        self.stats = dict()  # behaviour -> _NodeStats
+        self._attached = []  # (behaviour, phase name) of wrapped methods
+        self._instrumented = set()  # behaviours with wrapped methods
+
+    def attach(self, root: py_trees.behaviour.Behaviour) -> None:
+        """Instruments all behaviours of the tree under root, stats of a re-attached tree are continued"""
+        for behaviour in root.iterate():
+            if behaviour in self._instrumented:
+                continue
+            self._instrumented.add(behaviour)
+            self.stats.setdefault(behaviour, _NodeStats())
+            for phase, name in enumerate(PHASES):
+                setattr(behaviour, name, self._wrap(behaviour, phase, getattr(behaviour, name)))
+                self._attached.append((behaviour, name))
+
+    def detach(self) -> None:
+        """Removes the instrumentation, recorded data is kept"""
+        for behaviour, name in self._attached:
+            delattr(behaviour, name)  # the class method is visible again
+        self._attached.clear()
+        self._instrumented.clear()
+
+    def _wrap(self, behaviour: py_trees.behaviour.Behaviour, phase: int, method):
+        stats = self.stats[behaviour]
+        perf_counter = time.perf_counter
+        histogram = stats.histograms[phase]
+        last_bucket = HISTOGRAM_BUCKETS - 1
+        # raw (unformatted) feedback of okon_actions behaviours, formatted text of others
+        feedback = "_feedback" if hasattr(behaviour, "set_feedback") else "feedback_message"
+
+        def profiled(*args):
+            start = perf_counter()
+            status = method(*args)
+            duration = perf_counter() - start
+            if phase == 2:  # terminate(new_status)
+                status = args[0]
+            i = self.recorded % self.capacity
+            self._behaviours[i] = behaviour
+            self._phases[i] = phase
+            self._starts[i] = start
+            self._durations[i] = duration
+            self._statuses[i] = status
+            self._feedbacks[i] = getattr(behaviour, feedback) if phase == 1 else None
+            self.recorded += 1
+            stats.calls[phase] += 1
+            stats.total[phase] += duration
+            if duration > stats.max[phase]:
+                stats.max[phase] = duration
+            histogram[min(int(duration * 1e6).bit_length(), last_bucket)] += 1
+            return status if phase == 1 else None
+
+        return profiled
+
+    def records(self, last: int = None) -> list:
+        """Recorded calls (behaviour, phase, start, duration, status, raw feedback), oldest first"""
+        count = min(self.recorded, self.capacity)
+        if last is not None:
+            count = min(count, last)
+        first = self.recorded - count
+        return [
+            (
+                self._behaviours[i],
+                PHASES[self._phases[i]],
+                self._starts[i],
+                self._durations[i],
+                self._statuses[i],
+                self._feedbacks[i],
+            )
+            for i in (j % self.capacity for j in range(first, self.recorded))
+        ]
+
+    def format_trace(self, last: int = None) -> str:
+        records = self.records(last)
+        if not records:
+            return ""
+        origin = records[0][2]
+        lines = []
+        for behaviour, phase, start, duration, status, feedback in records:
+            if type(feedback) is tuple:
+                feedback = feedback[0].format(*feedback[1:])
+            line = f"{start - origin:+10.6f} {behaviour.name:<40} {phase:<10} {duration * 1e6:9.1f} us"
+            if status is not None:
+                line += f" {status.value}"
+            if feedback:
+                line += f" [{feedback}]"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def histogram(self, behaviour: py_trees.behaviour.Behaviour, phase: str = "update") -> list:
+        """[(upper bound [s], count)] of durations of phase calls of behaviour, the last bound is inf"""
+        counts = self.stats[behaviour].histograms[PHASES.index(phase)]
+        return [
+            (2**i * 1e-6 if i < HISTOGRAM_BUCKETS - 1 else float("inf"), count)
+            for i, count in enumerate(counts)
+            if count
+        ]
+
+    def summary(self) -> list:
+        """Per behaviour and phase: calls, total, mean and max duration [s], sorted by total time"""
+        rows = []
+        for behaviour, stats in self.stats.items():
+            for phase, name in enumerate(PHASES):
+                calls = stats.calls[phase]
+                if calls:
+                    rows.append(
+                        {
+                            "behaviour": behaviour.name,
+                            "phase": name,
+                            "calls": calls,
+                            "total": stats.total[phase],
+                            "mean": stats.total[phase] / calls,
+                            "max": stats.max[phase],
+                        }
+                    )
+        rows.sort(key=lambda row: row["total"], reverse=True)
+        return rows
+
+    def print_histograms(self, phase: str = "update") -> None:
+        for behaviour, stats in self.stats.items():
+            if not stats.calls[PHASES.index(phase)]:
+                continue
+            print(f"{behaviour.name} ({phase})")
+            buckets = self.histogram(behaviour, phase)
+            most = max(count for _, count in buckets)
+            for bound, count in buckets:
+                print(f"  < {bound * 1e6:>9.0f} us {count:>8} {'#' * max(1, round(40 * count / most))}")
+
+    def flame(self) -> list:
+        """Collapsed stacks ("Root;Sequence;Leaf microseconds") of time spent in behaviour methods"""
+        lines = []
+        for behaviour, stats in self.stats.items():
+            total = sum(stats.total)
+            if total > 0:
+                lines.append(f"{';'.join(_path(behaviour))} {round(total * 1e6)}")
+        return lines
+
+    def reset(self) -> None:
+        self.recorded = 0
+        self._behaviours = [None] * self.capacity
+        self._statuses = [None] * self.capacity
+        self._feedbacks = [None] * self.capacity
+        for stats in self.stats.values():
+            stats.__init__()
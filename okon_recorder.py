@@ -0,0 +1,165 @@
+"""Recording of OKON client telemetry and its replay.
+
+The log is a sequence of records (timestamp, direction, packet type, packet flag,
+data length, data) after a magic header. Offsets and timestamps of all records
+are written to a sidecar index file (log path + ".idx"), so the log can be
+seeked by record number or time without scanning it.
+
+    oc.start_recording("mission.okonrec")
+    ...
+    oc.stop_recording()
+
+    with TelemetryReplay("mission.okonrec") as replay:
+        replay.replay(oc, speed=None)  # as fast as possible
+"""
+import bisect
+import mmap
+import os
+import struct
+import time
+from threading import Event, Lock
+
+MAGIC = b"OKONREC1"
+RECORD_HEADER = struct.Struct("<dBBBI")  # monotonic timestamp, direction, packet type, packet flag, data length
+INDEX_ENTRY = struct.Struct("<Qd")  # record offset, monotonic timestamp
+
+RECEIVED = 0
+SENT = 1
+
+
+class TelemetryRecorder:
+    """Appends sent and received packets to a binary log"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._log = open(path, "wb")
+        self._index = open(path + ".idx", "wb")
+        self._log.write(MAGIC)
+        self._offset = len(MAGIC)
+        self._lock = Lock()  # packets are recorded from both receive and sync threads
+        self.records = 0
+
+    def record(self, direction: int, packet_type: int, packet_flag: int, data) -> None:
+        timestamp = time.monotonic()
+        with self._lock:
+            if self._log.closed:  # recording was stopped by another thread
+                return
+            self._log.write(RECORD_HEADER.pack(timestamp, direction, packet_type, packet_flag, len(data)))
+            self._log.write(data)
+            self._index.write(INDEX_ENTRY.pack(self._offset, timestamp))
+            self._offset += RECORD_HEADER.size + len(data)
+            self.records += 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._log.close()
+            self._index.close()
+
+
+class TelemetryReplay:
+    """Memory-mapped reader of a telemetry log"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an OKON telemetry log")
+        self._view = memoryview(self._mmap)
+        self.offsets, self.timestamps = self._load_index()
+
+    def _load_index(self) -> tuple:
+        index_path = self.path + ".idx"
+        offsets, timestamps = [], []
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as f:
+                data = f.read()
+            data = data[: len(data) - len(data) % INDEX_ENTRY.size]  # drop a partially written entry
+            for offset, timestamp in INDEX_ENTRY.iter_unpack(data):
+                offsets.append(offset)
+                timestamps.append(timestamp)
+        else:  # no index, scan the log
+            offset = len(MAGIC)
+            while offset + RECORD_HEADER.size <= len(self._mmap):
+                timestamp, _, _, _, length = RECORD_HEADER.unpack_from(self._mmap, offset)
+                offsets.append(offset)
+                timestamps.append(timestamp)
+                offset += RECORD_HEADER.size + length
+        while offsets and not self._complete(offsets[-1]):  # the last record was not written completely
+            offsets.pop()
+            timestamps.pop()
+        return offsets, timestamps
+
+    def _complete(self, offset: int) -> bool:
+        if offset + RECORD_HEADER.size > len(self._mmap):
+            return False
+        return offset + RECORD_HEADER.size + RECORD_HEADER.unpack_from(self._mmap, offset)[4] <= len(self._mmap)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def frame(self, i: int) -> tuple:
+        """Returns (timestamp, direction, packet_type, packet_flag, data) of record i, data is a view of the log"""
+        offset = self.offsets[i]
+        timestamp, direction, packet_type, packet_flag, length = RECORD_HEADER.unpack_from(self._mmap, offset)
+        data_start = offset + RECORD_HEADER.size
+        return timestamp, direction, packet_type, packet_flag, self._view[data_start : data_start + length]
+
+    def find(self, timestamp: float) -> int:
+        """Returns number of the first record at or after timestamp"""
+        return bisect.bisect_left(self.timestamps, timestamp)
+
+    def frames(self, start: int = 0, stop: int = None, direction: int = None):
+        for i in range(start, len(self) if stop is None else stop):
+            frame = self.frame(i)
+            if direction is None or frame[1] == direction:
+                yield frame
+
+    def replay(
+        self, okon_client, speed: float = 1.0, start: int = 0, stop: int = None, stop_event: Event = None
+    ) -> dict:
+        """Feeds received packets to okon_client._handle_packet.
+
+        With speed (1.0 = original speed) original timing is kept, with speed None packets are fed as fast as possible.
+        A replay in another thread ends early when stop_event is set, join it before close().
+        """
+        first_timestamp = last_timestamp = None
+        replay_start = time.monotonic()
+        n = 0
+        for timestamp, _, packet_type, packet_flag, data in self.frames(start, stop, RECEIVED):
+            if stop_event is not None and stop_event.is_set():
+                break
+            if first_timestamp is None:
+                first_timestamp = timestamp
+            last_timestamp = timestamp
+            if speed is not None:
+                delay = replay_start + (timestamp - first_timestamp) / speed - time.monotonic()
+                if delay > 0:
+                    if stop_event is None:
+                        time.sleep(delay)
+                    elif stop_event.wait(delay):
+                        break
+            okon_client._handle_packet(packet_type, packet_flag, data)
+            n += 1
+        elapsed = time.monotonic() - replay_start
+        duration = last_timestamp - first_timestamp if n > 0 else 0.0
+        return {
+            "packets": n,
+            "elapsed": elapsed,
+            "packets_per_second": n / elapsed if elapsed > 0 else 0.0,
+            "speedup": duration / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def close(self) -> None:
+        try:
+            self._view.release()
+            self._mmap.close()
+        except BufferError:  # views of frames are still used, the map is closed when they are released
+            pass
+        self._file.close()
@@ -0,0 +1,180 @@
+"""Running of py_trees behavior trees controlling OKON.
+
+Timed behaviours (like okon_actions.Wait) return RUNNING until their deadline
+and report it by next_wake_up() (monotonic time), so the tree is ticked at the
+deadline instead of the next fixed period and never blocks in a behaviour.
+
+    scheduler = TickScheduler(root, oc.okon, period=0.1)
+    scheduler.run(ticks=200)
+
+TreeRunner ticks as soon as new sensor data arrives instead:
+
+    runner = TreeRunner(root, oc, min_rate=5.0, max_rate=50.0, display_interval=1.0)
+    runner.run(duration=60.0)
+    print(runner.get_stats())
+"""
+import time
+from threading import Event
+
+import py_trees
+
+from okon_client import PacketType
+from okon_metrics import RollingStats
+
+RUNNING = py_trees.common.Status.RUNNING
+
+
+def next_wake_up(behaviour: py_trees.behaviour.Behaviour) -> float:
+    """Earliest next_wake_up() of running timed behaviours in the running branch of the tree (inf if none)"""
+    wake_up = float("inf")
+    if behaviour.status != RUNNING:
+        return wake_up
+    if hasattr(behaviour, "next_wake_up"):
+        wake_up = behaviour.next_wake_up()
+    for child in behaviour.children:
+        wake_up = min(wake_up, next_wake_up(child))
+    return wake_up
+
+
+class TickScheduler:
+    """Ticks a tree every period [s] or earlier when a timed behaviour wakes up.
+
+    With okon, every tick runs on a frozen snapshot of its state (Okon.snapshot()).
+    """
+
+    def __init__(self, root: py_trees.behaviour.Behaviour, okon=None, period: float = 0.1) -> None:
+        self.root = root
+        self.okon = okon
+        self.period = period
+        self.last_tick = None  # monotonic time of the last tick
+        self.ticks = 0
+        self._start = None  # monotonic time of starting run()
+
+    def tick(self) -> None:
+        self.last_tick = time.monotonic()
+        if self.okon is not None:
+            with self.okon.snapshot():
+                self.root.tick_once()
+        else:
+            self.root.tick_once()
+        self.ticks += 1
+
+    def next_tick_time(self) -> float:
+        if self.last_tick is None:
+            return time.monotonic()
+        return min(self.last_tick + self.period, next_wake_up(self.root))
+
+    def wait(self) -> None:
+        """Sleeps until the next tick is due"""
+        delay = self.next_tick_time() - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def run(self, ticks: int = None, on_tick=None, duration: float = None) -> None:
+        """Ticks the tree (ticks times, for duration [s] or until interrupted).
+
+        on_tick(scheduler) is called after every tick.
+        """
+        self._start = time.monotonic()
+        end = float("inf") if duration is None else self._start + duration
+        while (ticks is None or self.ticks < ticks) and time.monotonic() < end:
+            self.wait()
+            self.tick()
+            if on_tick is not None:
+                on_tick(self)
+
+
+def display_tree(runner) -> None:
+    print(f"\n{f'tick = {runner.ticks - 1}':.^30}\n")
+    print(py_trees.display.unicode_tree(root=runner.root, show_status=True))
+    print(py_trees.display.unicode_blackboard())
+
+
+class TreeRunner(TickScheduler):
+    """Ticks a tree when new data of trigger_types arrives, but at least min_rate and at most max_rate times a second.
+
+    Timed behaviours are woken up as with TickScheduler. The tree is displayed by display(runner)
+    at most every display_interval [s] (never with None) or once after show() is called.
+    """
+
+    def __init__(
+        self,
+        root: py_trees.behaviour.Behaviour,
+        okon_client,
+        min_rate: float = 2.0,
+        max_rate: float = 50.0,
+        trigger_types: tuple = (PacketType.GET_SENS, PacketType.GET_DETE),
+        display_interval: float = None,
+        display=display_tree,
+    ) -> None:
+        super().__init__(root, okon_client.okon, period=1 / min_rate)
+        self.min_interval = 1 / max_rate
+        self.display_interval = display_interval
+        self.display = display
+        self._display_requested = False
+        self._last_display = float("-inf")
+        self._fresh = Event()  # set by the receive thread when new trigger data arrives
+        for packet_type in trigger_types:
+            okon_client.on_frame(packet_type, self._on_fresh_data)
+        self.tick_duration = RollingStats()  # [s]
+        self.tick_interval = RollingStats()  # time between starts of ticks [s]
+        self.overruns = 0  # ticks longer than 1 / max_rate
+        self.triggers = {"data": 0, "timer": 0, "wake_up": 0}
+
+    def _on_fresh_data(self, data) -> None:
+        self._fresh.set()
+
+    def wait(self) -> None:
+        """Sleeps until new data arrives (not sooner than 1 / max_rate after the last tick) or a deadline passes"""
+        if self.last_tick is None:
+            self.triggers["timer"] += 1
+            return
+        earliest = self.last_tick + self.min_interval
+        timer = self.last_tick + self.period
+        wake_up = next_wake_up(self.root)
+        deadline = min(timer, wake_up)
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                self.triggers["wake_up" if wake_up < timer else "timer"] += 1
+                return
+            if self._fresh.is_set():
+                if now >= earliest:
+                    self.triggers["data"] += 1
+                    return
+                time.sleep(min(earliest, deadline) - now)
+            else:
+                self._fresh.wait(deadline - now)
+
+    def tick(self) -> None:
+        self._fresh.clear()  # data arriving during the tick triggers the next one
+        previous = self.last_tick
+        super().tick()
+        duration = time.monotonic() - self.last_tick
+        self.tick_duration.add(duration)
+        if previous is not None:
+            self.tick_interval.add(self.last_tick - previous)
+        if duration > self.min_interval:
+            self.overruns += 1
+        if self.display is not None and (
+            self._display_requested
+            or (self.display_interval is not None and self.last_tick - self._last_display >= self.display_interval)
+        ):
+            self._display_requested = False
+            self._last_display = self.last_tick
+            self.display(self)
+
+    def show(self) -> None:
+        """Displays the tree after the next tick"""
+        self._display_requested = True
+
+    def get_stats(self) -> dict:
+        elapsed = time.monotonic() - self._start if self._start is not None else 0.0
+        return {
+            "ticks": self.ticks,
+            "rate": self.ticks / elapsed if elapsed > 0 else 0.0,
+            "tick_duration": self.tick_duration.summary(),
+            "tick_interval": self.tick_interval.summary(),
+            "overruns": self.overruns,
+            "triggers": dict(self.triggers),
+        }
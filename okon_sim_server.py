@@ -0,0 +1,656 @@
+"""Local stand-in for the OKON simulator (Okon.exe) for offline testing and load generation.
+
+The server speaks the same framing as OkonClient and answers every PacketType.
+OKON is a simple kinematic model: in stable mode depth and rotation follow the
+SET_STABLE setpoint with limited rates and velocity (in OKON frame) follows
+the velocity setpoint. Detections of scene objects are computed from the camera
+field of view, entering no-go and forbidden zones sends HIT_NGZ/HIT_FZ.
+
+    python okon_sim_server.py --port 44210 --latency 0.002 --jitter 0.001
+
+    with OkonSimServer(port=0) as server:  # port 0 picks a free port
+        oc = OkonClient("127.0.0.1", server.port)
+        server.flood(PacketType.GET_SENS, rate=None)  # as fast as possible
+"""
+import argparse
+import base64
+import json
+import math
+import random
+import socket
+import struct
+import time
+from array import array
+from queue import Queue
+from threading import Lock, Thread
+
+from okon_client import PacketFlag, PacketReader, PacketType, angle180, angle0360, pack_packet
+
+GRAVITY = 9.81
+WATER_DENSITY = 1000
+
+DEFAULT_OBJECTS = [  # qualification task: yellow gate 8 m ahead of the start
+    {"className": "gate", "pos": (0.5, -1.1, 8.0), "size": (3.0, 1.5)},
+]
+
+DEFAULT_PIDS = {axis: {"P": 1.0, "I": 0.0, "D": 0.1, "limit": 10.0} for axis in ("roll", "pitch", "yaw", "depth")}
+
+
+def _vector(v) -> dict:
+    return {"x": v[0], "y": v[1], "z": v[2]}
+
+
+def _approach(value: float, target: float, gain: float, max_rate: float, dt: float) -> tuple:
+    """Moves value toward target with the rate gain * error limited to max_rate, returns (value, rate)"""
+    rate = max(-max_rate, min(max_rate, gain * (target - value)))
+    if abs(rate * dt) > abs(target - value):
+        rate = (target - value) / dt
+    return value + rate * dt, rate
+
+
+class SimWorld:
+    """Kinematic model of OKON and the scene.
+
+    Coordinates follow the simulator: y is up, z is forward at zero yaw (rot.y),
+    depth is -pos.y. Objects are dicts with className, pos and size (width, height) of a gate
+    facing the z axis, zones are dicts with id, pos and radius.
+    """
+
+    def __init__(
+        self,
+        objects: list = None,
+        ngz: list = None,
+        fz: list = None,
+        start_pos: tuple = (0.0, 0.0, 0.0),
+        start_yaw: float = 0.0,
+        max_rot_speed: float = 45.0,
+        max_depth_speed: float = 0.5,
+        rot_gain: float = 2.0,
+        depth_gain: float = 1.0,
+        vel_time_constant: float = 0.5,
+        hfov: float = 60.0,
+        vfov: float = 45.0,
+        max_range: float = 15.0,
+        noise: float = 0.0,
+        seed: int = None,
+    ) -> None:
+        self.objects = DEFAULT_OBJECTS if objects is None else objects
+        self.ngz = ngz or []
+        self.fz = fz or []
+        self.start_pos = start_pos
+        self.start_yaw = start_yaw
+        self.max_rot_speed = max_rot_speed  # [deg/s]
+        self.max_depth_speed = max_depth_speed  # [m/s]
+        self.rot_gain = rot_gain  # [1/s]
+        self.depth_gain = depth_gain  # [1/s]
+        self.vel_time_constant = vel_time_constant  # [s]
+        self.hfov = hfov
+        self.vfov = vfov
+        self.max_range = max_range
+        self.noise = noise  # standard deviation of sensor noise (rotation [deg], depth [m])
+        self._random = random.Random(seed)
+        self.reset()
+
+    def reset(self) -> None:
+        self.time = 0.0  # simulated time since reset [s]
+        self.pos = list(self.start_pos)
+        self.rot = [0.0, self.start_yaw, 0.0]
+        self.rot_speed = [0.0, 0.0, 0.0]
+        self.vel = [0.0, 0.0, 0.0]  # in OKON frame
+        self.accel = [0.0, 0.0, 0.0]
+        self.armed = False
+        self.mode = "stable"
+        self.stable = {"rot": _vector(self.rot), "vel": _vector((0.0, 0.0, 0.0)), "depth": self.depth}
+        self.acro = {"rotSpeed": _vector((0.0, 0.0, 0.0)), "vel": _vector((0.0, 0.0, 0.0))}
+        self.motors = dict.fromkeys(("FLH", "FLV", "BLV", "BLH", "FRH", "FRV", "BRV", "BRH"), 0)
+        self.pids = json.loads(json.dumps(DEFAULT_PIDS))
+        self.passed = dict()  # object index -> simulated time of passing the gate
+        self.hits = {"ngz": 0, "fz": 0}
+        self._in_zones = set()
+        self.events = []  # (packet type, data) of HIT_NGZ/HIT_FZ not sent yet
+
+    @property
+    def depth(self) -> float:
+        return -self.pos[1]
+
+    def step(self, dt: float, max_step: float = 0.01) -> None:
+        """Advances the simulation by dt [s] in steps of at most max_step"""
+        while dt > 1e-9:
+            h = min(dt, max_step)
+            self._step(h)
+            dt -= h
+
+    def _step(self, dt: float) -> None:
+        if self.mode == "stable":
+            target_rot = (self.stable["rot"]["x"], self.stable["rot"]["y"], self.stable["rot"]["z"])
+            for i in range(3):
+                error = angle180(angle0360(target_rot[i] - self.rot[i]))
+                _, self.rot_speed[i] = _approach(0.0, error, self.rot_gain, self.max_rot_speed, dt)
+            self.pos[1] = -_approach(self.depth, self.stable["depth"], self.depth_gain, self.max_depth_speed, dt)[0]
+            target_vel = (self.stable["vel"]["x"], 0.0, self.stable["vel"]["z"])
+        elif self.mode == "acro":
+            rot_speed = self.acro["rotSpeed"]
+            self.rot_speed = [rot_speed["x"], rot_speed["y"], rot_speed["z"]]
+            target_vel = (self.acro["vel"]["x"], self.acro["vel"]["y"], self.acro["vel"]["z"])
+        else:  # manual control is not modelled, OKON drifts to a stop
+            self.rot_speed = [0.0, 0.0, 0.0]
+            target_vel = (0.0, 0.0, 0.0)
+        for i in range(3):
+            self.rot[i] = angle0360(self.rot[i] + self.rot_speed[i] * dt)
+            previous = self.vel[i]
+            self.vel[i] += (target_vel[i] - self.vel[i]) * min(1.0, dt / self.vel_time_constant)
+            self.accel[i] = (self.vel[i] - previous) / dt
+
+        yaw = math.radians(self.rot[1])
+        previous_z = self.pos[2]
+        self.pos[0] += (self.vel[2] * math.sin(yaw) + self.vel[0] * math.cos(yaw)) * dt
+        self.pos[1] = min(0.0, self.pos[1] + self.vel[1] * dt)
+        self.pos[2] += (self.vel[2] * math.cos(yaw) - self.vel[0] * math.sin(yaw)) * dt
+        self.time += dt
+        self._check_gates(previous_z)
+        self._check_zones()
+
+    def _check_gates(self, previous_z: float) -> None:
+        for i, obj in enumerate(self.objects):
+            x, y, z = obj["pos"]
+            if i in self.passed or (previous_z - z) * (self.pos[2] - z) > 0 or previous_z == self.pos[2]:
+                continue
+            width, height = obj.get("size", (1.0, 1.0))
+            if abs(self.pos[0] - x) <= width / 2 and abs(self.pos[1] - y) <= height / 2:
+                self.passed[i] = self.time
+
+    def _check_zones(self) -> None:
+        for kind, packet_type, zones in (("ngz", PacketType.HIT_NGZ, self.ngz), ("fz", PacketType.HIT_FZ, self.fz)):
+            for zone in zones:
+                key = (kind, zone["id"])
+                inside = math.dist(self.pos, zone["pos"]) <= zone["radius"]
+                if inside and key not in self._in_zones:
+                    self.hits[kind] += 1
+                    self.events.append((packet_type, {"id": zone["id"]}))
+                if inside:
+                    self._in_zones.add(key)
+                else:
+                    self._in_zones.discard(key)
+
+    def _noisy(self, value: float) -> float:
+        return value + self._random.gauss(0.0, self.noise) if self.noise else value
+
+    def sens(self) -> dict:
+        return {
+            "rot": _vector([self._noisy(a) for a in self.rot]),
+            "rotSpeed": _vector(self.rot_speed),
+            "rotAccel": _vector((0.0, 0.0, 0.0)),
+            "accel": _vector((self.accel[0], self.accel[1] - GRAVITY, self.accel[2])),
+            "baro": {"pressure": max(0.0, self._noisy(self.depth)) * WATER_DENSITY * GRAVITY},
+        }
+
+    def orien(self) -> dict:
+        return {"pos": _vector(self.pos), "rot": _vector(self.rot)}
+
+    def detections(self) -> list:
+        """Detections of all objects, objects out of the field of view are not visibleInFrame"""
+        yaw = math.radians(self.rot[1])
+        tan_h = math.tan(math.radians(self.hfov / 2))
+        tan_v = math.tan(math.radians(self.vfov / 2))
+        detections = []
+        for obj in self.objects:
+            dx, dy, dz = (obj["pos"][i] - self.pos[i] for i in range(3))
+            forward = dz * math.cos(yaw) + dx * math.sin(yaw)
+            right = dx * math.cos(yaw) - dz * math.sin(yaw)
+            distance = math.sqrt(dx * dx + dy * dy + dz * dz)
+            width, height = obj.get("size", (1.0, 1.0))
+            detection = {
+                "className": obj["className"],
+                "visibleInFrame": False,
+                "min": {"x": 0.0, "y": 0.0},
+                "max": {"x": 0.0, "y": 0.0},
+                "distance": distance,
+            }
+            if forward > 0.1 and distance <= self.max_range:
+                x0 = 0.5 + 0.5 * (right - width / 2) / forward / tan_h
+                x1 = 0.5 + 0.5 * (right + width / 2) / forward / tan_h
+                y0 = 0.5 - 0.5 * (dy + height / 2) / forward / tan_v
+                y1 = 0.5 - 0.5 * (dy - height / 2) / forward / tan_v
+                if x1 > 0 and x0 < 1 and y1 > 0 and y0 < 1:
+                    detection["visibleInFrame"] = True
+                    detection["min"] = {"x": max(0.0, x0), "y": max(0.0, y0)}
+                    detection["max"] = {"x": min(1.0, x1), "y": min(1.0, y1)}
+                    detection["distance"] = self._noisy(distance)
+            detections.append(detection)
+        return detections
+
+    def depth_row(self, width: int, far: float = 20.0) -> array:
+        """One row of the depth map: distance of visible objects in their columns, far elsewhere"""
+        row = array("f", [far]) * width
+        for detection in self.detections():
+            if detection["visibleInFrame"]:
+                for col in range(int(detection["min"]["x"] * width), int(detection["max"]["x"] * width)):
+                    row[col] = min(row[col], detection["distance"])
+        return row
+
+    def checkpoints(self) -> list:
+        return [
+            {
+                "id": i,
+                "className": obj["className"],
+                "pos": _vector(obj["pos"]),
+                "passed": i in self.passed,
+                "time": self.passed.get(i),
+            }
+            for i, obj in enumerate(self.objects)
+        ]
+
+
+class _Connection:
+    """Client connection, replies are written by a sender thread after the configured latency"""
+
+    def __init__(self, server, sock: socket.socket) -> None:
+        self.server = server
+        self.socket = sock
+        self.connected = True
+        self._send_lock = Lock()
+        self._replies = Queue()  # (due time, frame)
+        self._last_due = 0.0
+        self.flood = (None, None)  # packet type and rate [1/s], replaced as a whole so the thread sees a consistent pair
+
+    def start(self) -> None:
+        Thread(target=self._recv_thread, daemon=True).start()
+        Thread(target=self._send_thread, daemon=True).start()
+        Thread(target=self._flood_thread, daemon=True).start()
+
+    def reply(self, packet_type: int, packet_flag: int, data: bytes = b"") -> None:
+        frame = pack_packet(packet_type, packet_flag, data)
+        delay = self.server.latency + (random.uniform(0.0, self.server.jitter) if self.server.jitter else 0.0)
+        if delay <= 0:
+            self.write(frame)
+            return
+        due = max(time.monotonic() + delay, self._last_due)  # the stream keeps the order of replies
+        self._last_due = due
+        self._replies.put((due, frame))
+
+    def write(self, data: bytes) -> None:
+        try:
+            with self._send_lock:
+                self.socket.sendall(data)
+            self.server.stats["sent_bytes"] += len(data)
+        except OSError:
+            self.close()
+
+    def close(self) -> None:
+        if self.connected:
+            self.connected = False
+            self._replies.put(None)
+            self.socket.close()
+            self.server._connections.discard(self)
+
+    def _recv_thread(self) -> None:
+        reader = PacketReader()
+        while self.connected:
+            try:
+                if reader.recv(self.socket) == 0:
+                    break
+            except OSError:
+                break
+            for packet_type, packet_flag, data in reader.packets():
+                self.server._handle_packet(self, packet_type, packet_flag, data)
+        self.close()
+
+    def _send_thread(self) -> None:
+        while True:
+            item = self._replies.get()
+            if item is None:
+                return
+            frames = []
+            while item is not None:
+                due, frame = item
+                delay = due - time.monotonic()
+                if delay > 0:
+                    if frames:  # write what is due before waiting
+                        self.write(b"".join(frames))
+                        frames = []
+                    time.sleep(delay)
+                frames.append(frame)
+                item = None if self._replies.empty() else self._replies.get_nowait()
+            self.write(b"".join(frames))
+            if not self.connected:
+                return
+
+    def _flood_thread(self) -> None:
+        next_time = time.monotonic()
+        while self.connected:
+            packet_type, rate = self.flood
+            if packet_type is None:
+                time.sleep(0.01)
+                next_time = time.monotonic()
+                continue
+            frame = pack_packet(packet_type, PacketFlag.DO_NOT_LOG_PACKET, self.server._payload(packet_type))
+            if rate is None:  # as fast as possible, in batches to keep syscalls out of the way
+                self.write(frame * max(1, (1 << 16) // len(frame)))
+                self.server.stats["flooded"] += max(1, (1 << 16) // len(frame))
+                continue
+            self.write(frame)
+            self.server.stats["flooded"] += 1
+            next_time += 1 / rate
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -1.0:  # too far behind, do not burst
+                next_time = time.monotonic()
+
+
+class OkonSimServer:
+    """Stand-in OKON simulator server.
+
+    Every reply is delayed by latency plus a uniformly random jitter [s], time_scale speeds up
+    the simulated time. Requests with SERVER_ECHO flag are also echoed back as they are.
+    With timestamp_pings PING replies are followed by " <server time.time()>" (for clock offset
+    estimation of okon_metrics.LatencyMonitor), otherwise PINGs are only echoed.
+    """
+
+    def __init__(
+        self,
+        ip: str = "127.0.0.1",
+        port: int = 44210,
+        world: SimWorld = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        time_scale: float = 1.0,
+        video_size: tuple = (640, 480),
+        depth_size: tuple = (640, 480),
+        timestamp_pings: bool = False,
+        debug: bool = False,
+    ) -> None:
+        self.ip = ip
+        self.port = port
+        self.world = world if world is not None else SimWorld()
+        self.latency = latency
+        self.jitter = jitter
+        self.time_scale = time_scale
+        self.video_size = video_size
+        self.depth_size = depth_size
+        self.timestamp_pings = timestamp_pings
+        self.debug = debug
+        self.running = False
+        self._server = None
+        self._connections = set()
+        self._lock = Lock()  # guards the world, packets of all connections are handled on their own threads
+        self._last_step = time.monotonic()
+        self._video_frame = None
+        self._video_seq = 0
+        self._flood = (None, None)  # packet type and rate flooded to new connections
+        self.stats = {"received": 0, "replied": 0, "sent_bytes": 0, "flooded": 0, "by_type": dict()}
+        self._handlers = {
+            PacketType.SET_MTR: self._handle_motors,
+            PacketType.ARM_MTR: self._handle_arm,
+            PacketType.DISARM_MTR: self._handle_arm,
+            PacketType.SET_CONTROL_MODE: self._handle_mode,
+            PacketType.SET_ACRO: self._handle_acro,
+            PacketType.SET_STABLE: self._handle_stable,
+            PacketType.SET_PID: self._handle_pids,
+            PacketType.GET_SENS: self._handle_get,
+            PacketType.GET_DEPTH: self._handle_get,
+            PacketType.GET_DEPTH_BYTES: self._handle_get,
+            PacketType.GET_VIDEO_BYTES: self._handle_get,
+            PacketType.GET_VIDEO: self._handle_get,
+            PacketType.SET_SIM: self._handle_set_sim,
+            PacketType.ACK: self._handle_ignored,
+            PacketType.SET_ORIEN: self._handle_orien,
+            PacketType.RST_SIM: self._handle_reset,
+            PacketType.PING: self._handle_ping,
+            PacketType.GET_CPS: self._handle_get,
+            PacketType.HIT_NGZ: self._handle_ignored,
+            PacketType.HIT_FZ: self._handle_ignored,
+            PacketType.CHK_AP: self._handle_ack,
+            PacketType.ERROR: self._handle_ignored,
+            PacketType.REC_STRT: self._handle_ack,
+            PacketType.REC_ST: self._handle_ack,
+            PacketType.REC_RST: self._handle_ack,
+            PacketType.GET_REC: self._handle_get,
+            PacketType.GET_DETE: self._handle_get,
+        }
+
+    def start(self) -> "OkonSimServer":
+        self._server = socket.create_server((self.ip, self.port))
+        self.ip, self.port = self._server.getsockname()[:2]
+        self.running = True
+        self._last_step = time.monotonic()
+        Thread(target=self._accept_thread, daemon=True).start()
+        if self.debug:
+            print(f"OKON simulator listening on {self.ip}:{self.port}")
+        return self
+
+    def stop(self) -> None:
+        self.running = False
+        if self._server is not None:
+            self._server.close()
+        for connection in list(self._connections):
+            connection.close()
+
+    def __enter__(self) -> "OkonSimServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def flood(self, packet_type: int = PacketType.GET_SENS, rate: float = None) -> None:
+        """Sends packet_type to all clients unrequested at rate [1/s] (None = as fast as possible).
+
+        Flooded packets are not delayed by latency, flooding is stopped with packet_type None.
+        """
+        self._flood = (packet_type, rate)
+        for connection in list(self._connections):
+            connection.flood = self._flood
+
+    def _accept_thread(self) -> None:
+        while self.running:
+            try:
+                sock, address = self._server.accept()
+            except OSError:
+                break
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = _Connection(self, sock)
+            connection.flood = self._flood
+            self._connections.add(connection)
+            connection.start()
+            if self.debug:
+                print(f"client connected from {address[0]}:{address[1]}")
+
+    def _advance(self) -> None:
+        """Steps the world to the current time, called with _lock held"""
+        now = time.monotonic()
+        self.world.step((now - self._last_step) * self.time_scale)
+        self._last_step = now
+        if self.world.events:
+            events, self.world.events = self.world.events, []
+            for packet_type, data in events:
+                self._broadcast(packet_type, json.dumps(data).encode())
+
+    def _broadcast(self, packet_type: int, data: bytes) -> None:
+        for connection in list(self._connections):
+            connection.reply(packet_type, PacketFlag.NONE, data)
+
+    def _handle_packet(self, connection: _Connection, packet_type: int, packet_flag: int, data: memoryview) -> None:
+        self.stats["received"] += 1
+        by_type = self.stats["by_type"]
+        by_type[packet_type] = by_type.get(packet_type, 0) + 1
+        if self.debug and packet_flag & PacketFlag.DO_NOT_LOG_PACKET == 0:
+            print(f"SIM RECV {PacketType.get(packet_type)} {PacketFlag.get(packet_flag)} len:{len(data)}")
+        if packet_flag & PacketFlag.SERVER_ECHO:
+            connection.reply(packet_type, packet_flag, bytes(data))
+        with self._lock:
+            self._advance()
+            handler = self._handlers.get(packet_type, self._handle_unknown)
+            reply = handler(packet_type, bytes(data))
+        if reply is not None:
+            reply_type, reply_data = reply
+            self.stats["replied"] += 1
+            connection.reply(reply_type, packet_flag & PacketFlag.DO_NOT_LOG_PACKET, reply_data)
+
+    def _payload(self, packet_type: int) -> bytes:
+        """Current data of a get request or a flooded packet"""
+        world = self.world
+        if packet_type == PacketType.GET_SENS:
+            return json.dumps(world.sens()).encode()
+        if packet_type == PacketType.SET_ORIEN:
+            return json.dumps(world.orien()).encode()
+        if packet_type == PacketType.GET_DETE:
+            return json.dumps(world.detections()).encode()
+        if packet_type == PacketType.SET_STABLE:
+            return json.dumps(world.stable).encode()
+        if packet_type == PacketType.SET_ACRO:
+            return json.dumps(world.acro).encode()
+        if packet_type == PacketType.SET_PID:
+            return json.dumps(world.pids).encode()
+        if packet_type == PacketType.SET_MTR:
+            return json.dumps(world.motors).encode()
+        if packet_type == PacketType.SET_CONTROL_MODE:
+            return world.mode.encode()
+        if packet_type == PacketType.GET_CPS:
+            return json.dumps(world.checkpoints()).encode()
+        if packet_type == PacketType.GET_REC:
+            return b"[]"
+        if packet_type in (PacketType.GET_DEPTH_BYTES, PacketType.GET_DEPTH):
+            width, height = self.depth_size
+            data = world.depth_row(width).tobytes() * height
+            return data if packet_type == PacketType.GET_DEPTH_BYTES else base64.b64encode(data)
+        if packet_type in (PacketType.GET_VIDEO_BYTES, PacketType.GET_VIDEO):
+            data = self._video()
+            return data if packet_type == PacketType.GET_VIDEO_BYTES else base64.b64encode(data)
+        return b""
+
+    def _video(self) -> bytes:
+        """Raw RGB frame, a gradient with the frame number in the first 4 bytes"""
+        width, height = self.video_size
+        if self._video_frame is None or len(self._video_frame) != width * height * 3:
+            self._video_frame = bytearray(bytes(range(256)) * (width * height * 3 // 256 + 1))[: width * height * 3]
+        self._video_seq += 1
+        struct.pack_into("<I", self._video_frame, 0, self._video_seq)
+        return bytes(self._video_frame)
+
+    def _set_or_get(self, packet_type: int, data: bytes, apply) -> tuple:
+        """Requests without data get the current value, requests with data set it"""
+        if not data:
+            return packet_type, self._payload(packet_type)
+        try:
+            apply(json.loads(data))
+        except (ValueError, TypeError, KeyError) as err:
+            return PacketType.ERROR, json.dumps({"message": f"invalid {PacketType.get(packet_type)}: {err}"}).encode()
+        return None
+
+    def _handle_get(self, packet_type: int, data: bytes) -> tuple:
+        return packet_type, self._payload(packet_type)
+
+    def _handle_ignored(self, packet_type: int, data: bytes) -> None:
+        return None
+
+    def _handle_ack(self, packet_type: int, data: bytes) -> tuple:
+        return PacketType.ACK, b""
+
+    def _handle_unknown(self, packet_type: int, data: bytes) -> tuple:
+        return PacketType.ERROR, json.dumps({"message": f"unknown packet type {packet_type:#x}"}).encode()
+
+    def _handle_ping(self, packet_type: int, data: bytes) -> tuple:
+        if self.timestamp_pings:
+            return PacketType.PING, bytes(data) + f" {time.time()!r}".encode()
+        return PacketType.PING, data
+
+    def _handle_arm(self, packet_type: int, data: bytes) -> None:
+        self.world.armed = packet_type == PacketType.ARM_MTR
+
+    def _handle_mode(self, packet_type: int, data: bytes) -> tuple:
+        if not data:
+            return packet_type, self._payload(packet_type)
+        self.world.mode = data.decode("utf-8", "replace").strip('"')
+        return None
+
+    def _handle_stable(self, packet_type: int, data: bytes) -> tuple:
+        def apply(stable: dict) -> None:
+            world = self.world
+            world.stable = {
+                "rot": {**world.stable["rot"], **stable.get("rot", {})},
+                "vel": {**world.stable["vel"], **stable.get("vel", {})},
+                "depth": float(stable.get("depth", world.stable["depth"])),
+            }
+
+        return self._set_or_get(packet_type, data, apply)
+
+    def _handle_acro(self, packet_type: int, data: bytes) -> tuple:
+        def apply(acro: dict) -> None:
+            world = self.world
+            world.acro = {
+                "rotSpeed": {**world.acro["rotSpeed"], **acro.get("rotSpeed", acro.get("rot", {}))},
+                "vel": {**world.acro["vel"], **acro.get("vel", {})},
+            }
+
+        return self._set_or_get(packet_type, data, apply)
+
+    def _handle_pids(self, packet_type: int, data: bytes) -> tuple:
+        return self._set_or_get(packet_type, data, self.world.pids.update)
+
+    def _handle_motors(self, packet_type: int, data: bytes) -> tuple:
+        return self._set_or_get(packet_type, data, self.world.motors.update)
+
+    def _handle_orien(self, packet_type: int, data: bytes) -> tuple:
+        def apply(orien: dict) -> None:  # teleport
+            world = self.world
+            pos, rot = orien.get("pos", _vector(world.pos)), orien.get("rot", _vector(world.rot))
+            world.pos = [pos["x"], pos["y"], pos["z"]]
+            world.rot = [rot["x"], rot["y"], rot["z"]]
+
+        return self._set_or_get(packet_type, data, apply)
+
+    def _handle_set_sim(self, packet_type: int, data: bytes) -> tuple:
+        """Sets server options (latency, jitter, time_scale) and world parameters from JSON"""
+        try:
+            options = json.loads(data) if data else {}
+        except ValueError:
+            return PacketType.ERROR, json.dumps({"message": "invalid SET_SIM"}).encode()
+        for key, value in options.items():
+            if key in ("latency", "jitter", "time_scale", "timestamp_pings"):
+                setattr(self, key, value)
+            elif hasattr(self.world, key):
+                setattr(self.world, key, value)
+        return None
+
+    def _handle_reset(self, packet_type: int, data: bytes) -> tuple:
+        self.world.reset()
+        return PacketType.RST_SIM, b""
+
+    def get_stats(self) -> dict:
+        return dict(self.stats, by_type={PacketType.get(k) or k: v for k, v in self.stats["by_type"].items()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in OKON simulator server")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=44210)
+    parser.add_argument("--latency", type=float, default=0.0, help="reply latency [s]")
+    parser.add_argument("--jitter", type=float, default=0.0, help="max random extra latency [s]")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="simulated seconds per real second")
+    parser.add_argument("--noise", type=float, default=0.0, help="sensor noise standard deviation")
+    parser.add_argument("--timestamp-pings", action="store_true", help="append server time to PING replies")
+    parser.add_argument("--flood", choices=[name for name in vars(PacketType) if name.startswith("GET_")])
+    parser.add_argument("--flood-rate", type=float, default=None, help="flooded packets per second (default max)")
+    args = parser.parse_args()
+
+    server = OkonSimServer(
+        args.ip,
+        args.port,
+        SimWorld(noise=args.noise),
+        latency=args.latency,
+        jitter=args.jitter,
+        time_scale=args.time_scale,
+        timestamp_pings=args.timestamp_pings,
+        debug=True,
+    ).start()
+    if args.flood:
+        server.flood(getattr(PacketType, args.flood), args.flood_rate)
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
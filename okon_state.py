@@ -0,0 +1,179 @@
+"""Typed OKON state objects updated in place from decoded packets.
+
+Objects use __slots__ for cheap attribute access (okon.sens.imu.rot.y) and keep
+a dict compatible view (okon.sens["imu"]["rot"]["y"]) for older code.
+"""
+
+
+class State:
+    """Base of state objects, keys not known to a state are kept in extra"""
+
+    __slots__ = ("extra",)
+
+    def __init__(self) -> None:
+        self.extra = dict()
+
+    def __getitem__(self, key: str):
+        if key in self.__slots__:
+            return getattr(self, key)
+        return self.extra[key]
+
+    def __setitem__(self, key: str, value) -> None:
+        if key not in self.__slots__:
+            self.extra[key] = value
+            return
+        current = getattr(self, key)
+        if isinstance(current, State) and isinstance(value, dict):
+            current.update(value)
+        else:
+            setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__ or key in self.extra
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.__slots__) + len(self.extra)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (State, dict)):
+            return self.to_dict() == (other.to_dict() if isinstance(other, State) else other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.to_dict()})"
+
+    def get(self, key: str, default=None):
+        return self[key] if key in self else default
+
+    def keys(self) -> list:
+        return list(self.__slots__) + list(self.extra)
+
+    def items(self) -> list:
+        return [(key, self[key]) for key in self.keys()]
+
+    def update(self, values: dict) -> None:
+        """Updates the state in place from decoded packet data"""
+        slots = self.__slots__
+        for key, value in values.items():
+            if key not in slots:
+                self.extra[key] = value
+                continue
+            current = getattr(self, key)
+            if isinstance(current, State) and isinstance(value, dict):
+                current.update(value)
+            else:
+                setattr(self, key, value)
+
+    def to_dict(self) -> dict:
+        return {key: value.to_dict() if isinstance(value, State) else value for key, value in self.items()}
+
+
+class Vector3(State):
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x: float = 0, y: float = 0, z: float = 0) -> None:
+        super().__init__()
+        self.x = x
+        self.y = y
+        self.z = z
+
+    def update(self, values: dict) -> None:
+        self.x = values.get("x", self.x)
+        self.y = values.get("y", self.y)
+        self.z = values.get("z", self.z)
+
+
+class Imu(State):
+    __slots__ = ("rot", "rotSpeed", "rotAccel", "accel")
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.rot = Vector3()
+        self.rotSpeed = Vector3()
+        self.rotAccel = Vector3()
+        self.accel = Vector3()
+
+
+class Sensors(State):
+    __slots__ = ("imu", "baro", "detection")
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.imu = Imu()
+        self.baro = 0
+        self.detection = []
+
+
+class Stable(State):
+    __slots__ = ("rot", "vel", "depth")
+
+    def __init__(self, depth: float = 1.3) -> None:
+        super().__init__()
+        self.rot = Vector3()
+        self.vel = Vector3()
+        self.depth = depth
+
+
+class Acro(State):
+    __slots__ = ("rotSpeed", "vel")
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.rotSpeed = Vector3()
+        self.vel = Vector3()
+
+
+class Motors(State):
+    __slots__ = ("FLH", "FLV", "BLV", "BLH", "FRH", "FRV", "BRV", "BRH")
+
+    def __init__(self) -> None:
+        super().__init__()
+        for motor in self.__slots__:
+            setattr(self, motor, 0)
+
+
+class Control(State):
+    __slots__ = ("mode", "stable", "acro", "manual")
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.mode = "unknown"
+        self.stable = Stable()
+        self.acro = Acro()
+        self.manual = Motors()
+
+
+class Orientation(State):
+    __slots__ = ("pos", "rot")
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.pos = Vector3()
+        self.rot = Vector3()
+
+
+class DetectionIndex:
+    """Detections of one GET_DETE packet indexed by className.
+
+    Entries visible in frame are grouped by class and sorted by distance (nearest first).
+    """
+
+    __slots__ = ("seq", "timestamp", "detections", "by_class")
+
+    def __init__(self, detections: list = (), seq: int = 0, timestamp: float = 0.0) -> None:
+        self.seq = seq  # sequence number of the GET_DETE packet (0 before the first one)
+        self.timestamp = timestamp  # monotonic time of receiving the packet
+        self.detections = detections  # all entries as received
+        self.by_class = dict()
+        for detection in detections:
+            if detection["visibleInFrame"]:
+                self.by_class.setdefault(detection["className"], []).append(detection)
+        for entries in self.by_class.values():
+            entries.sort(key=lambda d: d.get("distance", float("inf")))
+
+    def get(self, class_name: str) -> list:
+        """Visible detections of class_name sorted by distance, the list is shared and must not be modified"""
+        return self.by_class.get(class_name, [])
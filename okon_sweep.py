@@ -0,0 +1,215 @@
+"""Parallel parameter sweeps of the qualification task mission.
+
+Every run is isolated in a worker process of a pool: it starts its own stand-in
+simulator (okon_sim_server) on a free port, or connects to a given server, or
+replays a recorded telemetry log, and ticks its own tree with its own OkonClient.
+Parameters are keyword arguments of qualification_task_behavior_tree.create_root.
+
+    runs = grid({"max_distance": [1.0, 1.5, 2.0], "speed": [0.5, 1.0]})
+    results = sweep(runs, processes=8, time_scale=4.0)
+
+    python okon_sweep.py --grid max_distance=1.0,1.5,2.0 speed=0.5,1.0 --output sweep.json
+    python okon_sweep.py --random 32 depth=0.9:1.3 rotation_delta=1.0:4.0 --seed 1
+
+Timed behaviours (Wait) run in real time, so with time_scale they last time_scale times
+longer in simulated time than in a real mission.
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from threading import Event, Thread
+
+import py_trees
+
+from okon_client import OkonClient, PacketType
+from okon_recorder import TelemetryReplay
+from okon_runner import TreeRunner
+from okon_sim_server import OkonSimServer, SimWorld
+from qualification_task_behavior_tree import create_root
+
+
+def grid(space: dict) -> list:
+    """All combinations of values of parameters, space maps parameter names to lists of values"""
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def random_search(space: dict, n: int, seed: int = None) -> list:
+    """n random combinations, a (low, high) tuple is sampled uniformly, a list by random choice"""
+    rng = random.Random(seed)
+    return [
+        {
+            name: rng.uniform(*values) if isinstance(values, tuple) else rng.choice(values)
+            for name, values in space.items()
+        }
+        for _ in range(n)
+    ]
+
+
+def _final_error(okon, checkpoints) -> float:
+    """Distance [m] of OKON from the center line of the first gate at the end of the run"""
+    if not checkpoints:
+        return None
+    gate = checkpoints[0]["pos"]
+    pos = okon.orien["pos"]
+    return math.hypot(pos["x"] - gate["x"], pos["y"] - gate["y"])
+
+
+def run_mission(
+    params: dict,
+    timeout: float = 60.0,
+    time_scale: float = 4.0,
+    server: tuple = None,
+    replay: str = None,
+    world_options: dict = None,
+    min_rate: float = 10.0,
+    max_rate: float = 20.0,
+) -> dict:
+    """Runs the mission once with create_root(okon, **params) and returns its outcome.
+
+    The run connects to server (ip, port) if given, feeds packets of the replay log if given,
+    otherwise starts its own OkonSimServer with SimWorld(**world_options).
+    """
+    sim = oc = log = replay_thread = None
+    stop_replay = Event()
+    try:
+        if replay is None and server is None:
+            sim = OkonSimServer(port=0, world=SimWorld(**(world_options or {})), time_scale=time_scale).start()
+            server = (sim.ip, sim.port)
+        oc = OkonClient(*(server or ("127.0.0.1", 0)), debug=False)
+        hits = {"ngz": 0, "fz": 0}
+        oc.on_event("hitNGZ", lambda zone: hits.__setitem__("ngz", hits["ngz"] + 1), inline=True)
+        oc.on_event("hitFZ", lambda zone: hits.__setitem__("fz", hits["fz"] + 1), inline=True)
+        if replay is not None:
+            log = TelemetryReplay(replay)
+            replay_thread = Thread(target=log.replay, args=(oc,), kwargs={"stop_event": stop_replay}, daemon=True)
+            replay_thread.start()
+        elif not oc.connect():
+            return {"params": params, "error": f"failed to connect to {server[0]}:{server[1]}"}
+        else:
+            time.sleep(0.2)  # first sync replies
+        root = create_root(oc.okon, **params)
+        root.setup_with_descendants()
+        runner = TreeRunner(root, oc, min_rate=min_rate, max_rate=max_rate, display=None)
+        completed = False
+        start = time.monotonic()
+        try:
+            runner.run(duration=timeout)
+        except SystemExit:  # Exit behaviour
+            completed = True
+        duration = time.monotonic() - start
+        checkpoints = None
+        if oc.connected:
+            oc.send(PacketType.GET_CPS)
+            deadline = time.monotonic() + 1.0
+            while oc.simulation.checkpoints is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            checkpoints = oc.simulation.checkpoints
+        return {
+            "params": params,
+            "completed": completed,
+            "duration": duration,
+            "ticks": runner.ticks,
+            "time_to_gate": checkpoints[0].get("time") if checkpoints else None,  # simulated time [s]
+            "ngz_hits": hits["ngz"],
+            "fz_hits": hits["fz"],
+            "final_error": _final_error(oc.okon, checkpoints),
+        }
+    finally:
+        if replay_thread is not None:  # frames of the log are read until the replay stops
+            stop_replay.set()
+            replay_thread.join()
+        if oc is not None and oc.connected:
+            oc.disconnect()
+        if sim is not None:
+            sim.stop()
+        if log is not None:
+            log.close()
+
+
+def sweep(runs: list, processes: int = None, **options) -> list:
+    """Runs run_mission(params, **options) for all params of runs on processes workers (default: all cores).
+
+    Runs against a shared server are run one at a time, as they would drive the same simulated OKON.
+    """
+    if options.get("server") is not None:
+        processes = 1
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as executor:
+        return list(executor.map(partial(run_mission, **options), runs))
+
+
+def _parse_space(items: list, ranges: bool) -> dict:
+    """name=v1,v2,... items (or name=low:high with ranges) into a search space"""
+    space = dict()
+    for item in items:
+        name, _, values = item.partition("=")
+        if ranges and ":" in values:
+            low, high = values.split(":")
+            space[name] = (float(low), float(high))
+        else:
+            space[name] = [float(value) for value in values.split(",")]
+    return space
+
+
+def print_results(results: list) -> None:
+    for result in sorted(results, key=lambda r: (not r.get("completed"), r.get("time_to_gate") or math.inf)):
+        params = " ".join(f"{name}={value:.3g}" for name, value in result["params"].items())
+        if "error" in result:
+            print(f"{params:<60} {result['error']}")
+            continue
+        time_to_gate = "-" if result["time_to_gate"] is None else f"{result['time_to_gate']:.2f} s"
+        final_error = "-" if result["final_error"] is None else f"{result['final_error']:.3f} m"
+        print(
+            f"{params:<60} completed={result['completed']!s:<5} gate={time_to_gate:>8} "
+            f"ngz={result['ngz_hits']} fz={result['fz_hits']} error={final_error}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel parameter sweep of the qualification task mission")
+    search = parser.add_mutually_exclusive_group(required=True)
+    search.add_argument("--grid", nargs="+", metavar="NAME=V1,V2", help="grid search over listed values")
+    search.add_argument("--random", type=int, metavar="N", help="N random runs over NAME=LOW:HIGH or NAME=V1,V2")
+    parser.add_argument("space", nargs="*", metavar="NAME=VALUES", help="search space of --random")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="max duration of a run [s]")
+    parser.add_argument("--time-scale", type=float, default=4.0, help="simulated seconds per real second")
+    parser.add_argument(
+        "--server", default=None, help="IP:PORT of a simulator used instead of own ones, runs one at a time"
+    )
+    parser.add_argument("--replay", default=None, help="telemetry log fed to every run instead of a simulator")
+    parser.add_argument("--output", default=None, help="JSON file for results")
+    args = parser.parse_args()
+
+    if args.grid:
+        runs = grid(_parse_space(args.grid, ranges=False))
+    else:
+        runs = random_search(_parse_space(args.space, ranges=True), args.random, args.seed)
+    server = None
+    if args.server:
+        ip, port = args.server.rsplit(":", 1)
+        server = (ip, int(port))
+    py_trees.logging.level = py_trees.logging.Level.WARN
+    results = sweep(
+        runs,
+        args.processes,
+        timeout=args.timeout,
+        time_scale=args.time_scale,
+        server=server,
+        replay=args.replay,
+    )
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
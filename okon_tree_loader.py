@@ -0,0 +1,317 @@
+"""Compiling of Behavior Tree Visual Editor projects (BTs/*.json) into py_trees trees.
+
+Leaf nodes are calls written in their titles, e.g. TryDetectNTimes(object="gate",n=3),
+text in square brackets after the call is a comment. Names of calls are looked up
+in the node factory registry, arguments which are not literals (setDepth(depth))
+are symbols resolved from params when the tree is built, so variants of a tree
+can be built from one project:
+
+    root = load_tree("BTs/qualificationTaskProjet.json", {"okon": oc.okon})
+    variants = build_trees("BTs/qualificationTaskProjet.json", {"okon": oc.okon}, [{"SetDepth.depth": d} for d in (0.9, 1.1)])
+
+Projects are parsed into a plain spec once per file content, the spec is cached
+in memory and in __pycache__ next to the project, keyed by hash of the file.
+"""
+import ast
+import hashlib
+import json
+import operator
+import os
+
+import py_trees
+
+import okon_actions
+
+SPEC_VERSION = 1  # version of the cached spec format
+
+NODE_FACTORIES = dict()  # call name -> factory(name, context, *args, **kwargs) returning a behaviour
+_spec_cache = dict()  # file hash -> parsed project
+
+
+def register_node(call_name: str, factory=None):
+    """Registers factory(name, context, *args, **kwargs) building behaviours of call_name nodes.
+
+    context holds objects shared by the tree (e.g. "okon"), can be used as a decorator.
+    """
+    if factory is None:
+        return lambda factory: register_node(call_name, factory)
+    NODE_FACTORIES[call_name] = factory
+    return factory
+
+
+def _okon_action(cls):
+    return lambda name, context, *args, **kwargs: cls(name, context["okon"], *args, **kwargs)
+
+
+for _cls in (
+    okon_actions.SetDepth,
+    okon_actions.SetVelocity,
+    okon_actions.Rotate,
+    okon_actions.RotateDeltaYawAngle,
+    okon_actions.TryDetectNTimes,
+    okon_actions.CalculateDeltaYaw,
+    okon_actions.IsGateFarEnough,
+    okon_actions.Wait,
+):
+    register_node(_cls.__name__, _okon_action(_cls))
+register_node("Exit", lambda name, context: okon_actions.Exit(name))
+register_node("End", lambda name, context: okon_actions.Exit(name))
+register_node("IsPathClear", lambda name, context, **kwargs: okon_actions.IsPathClear(name, context["depth_map"], **kwargs))
+
+_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+_COMPARISONS = (operator.eq, operator.ne, operator.lt, operator.le, operator.gt, operator.ge)
+
+
+def _blackboard_expression(text: str) -> tuple:
+    """Splits "key <operator> literal" into (key, operator, literal), other text is a flag (text, None, None)"""
+    try:
+        expr = ast.parse(text, mode="eval").body
+    except SyntaxError:  # free text flag like "failed to find"
+        return text, None, None
+    if isinstance(expr, ast.BinOp):
+        left, op, right = expr.left, expr.op, expr.right
+    elif isinstance(expr, ast.Compare) and len(expr.ops) == 1:
+        left, op, right = expr.left, expr.ops[0], expr.comparators[0]
+    else:
+        return text, None, None
+    if not isinstance(left, ast.Name) or type(op) not in _OPERATORS:
+        raise ValueError(f"unsupported blackboard expression {text!r}")
+    return left.id, _OPERATORS[type(op)], ast.literal_eval(right)
+
+
+def _check_blackboard(name: str, text: str) -> py_trees.behaviour.Behaviour:
+    key, op, value = _blackboard_expression(text)
+    if op is None:
+        op, value = operator.eq, True
+    elif op not in _COMPARISONS:
+        raise ValueError(f"blackboard check {text!r} is not a comparison")
+    return py_trees.behaviours.CheckBlackboardVariableValue(name, py_trees.common.ComparisonExpression(key, value, op))
+
+
+@register_node("setBlackboard")
+def _set_blackboard(name: str, context: dict, *args, **kwargs) -> py_trees.behaviour.Behaviour:
+    """setBlackboard(flag) sets flag to True, setBlackboard(key + 1) updates key, setBlackboard(key=value) sets key"""
+    setters = []
+    for text in args:
+        key, op, value = _blackboard_expression(text)
+        if op is None:
+            setters.append((key, True))
+        elif op in _COMPARISONS:
+            raise ValueError(f"blackboard update {text!r} is a comparison")
+        else:  # the key must be set before
+            setters.append((key, lambda key=key, op=op, value=value: op(py_trees.blackboard.Blackboard.get(key), value)))
+    setters.extend(kwargs.items())
+    behaviours = [
+        py_trees.behaviours.SetBlackboardVariable(name if len(setters) == 1 else f"{name} {key}", key, value, True)
+        for key, value in setters
+    ]
+    if len(behaviours) == 1:
+        return behaviours[0]
+    return py_trees.composites.Sequence(name, memory=True, children=behaviours)
+
+
+# isBlackboard(flag) succeeds when flag is set, isBlackboard(key > 3) compares, missing keys fail
+register_node("isBlackboard", lambda name, context, text: _check_blackboard(name, text))
+register_node(
+    "isNotBlackboard",
+    lambda name, context, text: py_trees.decorators.Inverter(name=name, child=_check_blackboard(f"{name} check", text)),
+)
+
+
+# editor composites (by node name) and decorators (by node title)
+COMPOSITES = {
+    "sequence": lambda name, children: py_trees.composites.Sequence(name, memory=True, children=children),
+    # with memory like the hand-built qualification tree, so running fallbacks are not restarted
+    "select": lambda name, children: py_trees.composites.Selector(name, memory=True, children=children),
+}
+DECORATORS = {
+    "Negate": lambda name, child: py_trees.decorators.Inverter(name=name, child=child),
+    "SuccessIsFailure": lambda name, child: py_trees.decorators.SuccessIsFailure(name=name, child=child),
+    "OneShot": lambda name, child: py_trees.decorators.OneShot(
+        name=name, child=child, policy=py_trees.common.OneShotPolicy.ON_COMPLETION
+    ),
+}
+
+
+def _split_title(title: str) -> tuple:
+    """Splits a node title into the call (name and arguments) and the comment in square brackets"""
+    depth = 0
+    quote = None
+    for i, c in enumerate(title):
+        if quote:
+            if c == quote:
+                quote = None
+        elif c in "\"'":
+            quote = c
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+            if depth == 0:
+                return title[: i + 1].strip(), title[i + 1 :].strip()
+        elif c == "[" and depth == 0:
+            return title[:i].strip(), title[i:].strip()
+    return title.strip(), ""
+
+
+def _argument(node: ast.expr):
+    """Literal value of an argument or {"symbol": source} of an argument resolved when the tree is built"""
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        return {"symbol": ast.unparse(node)}
+
+
+def parse_call(title: str) -> dict:
+    """Parses a leaf title like SetDepth(depth=1.1,delta=0.05)[comment]"""
+    call, comment = _split_title(title)
+    try:
+        expr = ast.parse(call, mode="eval").body
+    except SyntaxError:  # free text arguments (isBlackboard(failed to find)) are kept as one symbol
+        name, _, text = call.partition("(")
+        if not name.strip().isidentifier():
+            raise ValueError(f"invalid node title {title!r}") from None
+        text = text.rpartition(")")[0].strip()
+        return {"call": name.strip(), "args": [{"symbol": text}] if text else [], "kwargs": {}, "comment": comment}
+    if isinstance(expr, ast.Name):
+        return {"call": expr.id, "args": [], "kwargs": {}, "comment": comment}
+    if not isinstance(expr, ast.Call) or not isinstance(expr.func, ast.Name):
+        raise ValueError(f"node title {title!r} is not a call")
+    return {
+        "call": expr.func.id,
+        "args": [_argument(arg) for arg in expr.args],
+        "kwargs": {keyword.arg: _argument(keyword.value) for keyword in expr.keywords},
+        "comment": comment,
+    }
+
+
+def _parse_node(nodes: dict, node_id: str) -> dict:
+    node = nodes[node_id]
+    kind, title = node["name"], node["title"]
+    child_ids = node.get("children") or ([node["child"]] if node.get("child") else [])
+    children = [_parse_node(nodes, child_id) for child_id in child_ids]
+    if kind in COMPOSITES:
+        return {"composite": kind, "title": title, "children": children}
+    if children:
+        if len(children) != 1:
+            raise ValueError(f"decorator {title!r} has {len(children)} children")
+        return {"decorator": title, "title": title, "child": children[0]}
+    return dict(parse_call(title), title=title)
+
+
+def parse_project(data: dict) -> dict:
+    """Parses an editor project into a spec of its trees (plain JSON-serializable data)"""
+    trees = {}
+    for tree in data["trees"]:
+        trees[tree["title"]] = {
+            "properties": tree.get("properties", {}),
+            "root": _parse_node(tree["nodes"], tree["root"]),
+        }
+    selected = next((tree["title"] for tree in data["trees"] if tree["id"] == data.get("selectedTree")), None)
+    return {"version": SPEC_VERSION, "selected": selected, "trees": trees}
+
+
+def load_spec(path: str) -> dict:
+    """Parsed project at path, cached in memory and on disk by hash of the file content"""
+    with open(path, "rb") as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+    spec = _spec_cache.get(digest)
+    if spec is not None:
+        return spec
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), "__pycache__")
+    cache_path = os.path.join(cache_dir, f"{os.path.basename(path)}.{digest[:16]}.spec.json")
+    try:
+        with open(cache_path) as f:
+            spec = json.load(f)
+        if spec.get("version") != SPEC_VERSION:
+            spec = None
+    except (OSError, ValueError):
+        spec = None
+    if spec is None:
+        spec = parse_project(json.loads(content))
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(cache_path, "w") as f:
+                json.dump(spec, f)
+        except OSError as err:  # read-only checkout, the spec is still cached in memory
+            print(f"failed to cache parsed {path}: {err}")
+    _spec_cache[digest] = spec
+    return spec
+
+
+def _resolve(value, params: dict):
+    if isinstance(value, dict) and "symbol" in value:
+        return params.get(value["symbol"], value["symbol"])
+    return value
+
+
+def build(node: dict, context: dict, params: dict = None) -> py_trees.behaviour.Behaviour:
+    """Builds the behaviour of a parsed node.
+
+    params resolve symbolic arguments, params["<call>.<keyword>"] overrides keyword arguments of all calls.
+    """
+    params = params or {}
+    if "composite" in node:
+        children = [build(child, context, params) for child in node["children"]]
+        return COMPOSITES[node["composite"]](node["title"], children)
+    if "decorator" in node:
+        if node["decorator"] not in DECORATORS:
+            raise ValueError(f"unknown decorator {node['decorator']!r}")
+        return DECORATORS[node["decorator"]](node["title"], build(node["child"], context, params))
+    call = node["call"]
+    factory = NODE_FACTORIES.get(call)
+    if factory is None:
+        raise ValueError(f"no factory registered for {call!r} (node {node['title']!r})")
+    args = [_resolve(arg, params) for arg in node["args"]]
+    kwargs = {key: _resolve(value, params) for key, value in node["kwargs"].items()}
+    prefix = call + "."
+    for key, value in params.items():
+        if key.startswith(prefix):
+            kwargs[key[len(prefix) :]] = value
+    return factory(node["title"], context, *args, **kwargs)
+
+
+def missing_factories(node: dict) -> list:
+    """Sorted names of calls and decorators of a parsed node and its descendants which cannot be built"""
+    missing = set()
+    if "composite" in node:
+        for child in node["children"]:
+            missing.update(missing_factories(child))
+    elif "decorator" in node:
+        if node["decorator"] not in DECORATORS:
+            missing.add(node["decorator"])
+        missing.update(missing_factories(node["child"]))
+    elif node["call"] not in NODE_FACTORIES:
+        missing.add(node["call"])
+    return sorted(missing)
+
+
+def load_tree(path: str, context: dict, params: dict = None, tree: str = None) -> py_trees.behaviour.Behaviour:
+    """Builds the root behaviour of a tree (the selected one by default) of the project at path.
+
+    All nodes without a registered factory are reported at once before anything is built.
+    """
+    spec = load_spec(path)
+    title = tree or spec["selected"] or next(iter(spec["trees"]))
+    tree_spec = spec["trees"][title]
+    missing = missing_factories(tree_spec["root"])
+    if missing:
+        raise ValueError(f"tree {title!r} of {path} has nodes without registered factories: {', '.join(missing)}")
+    return build(tree_spec["root"], context, dict(tree_spec["properties"], **(params or {})))
+
+
+def build_trees(path: str, context: dict, variants: list, tree: str = None) -> list:
+    """Builds a tree for every params dict in variants, the project is parsed only once"""
+    return [load_tree(path, context, params, tree) for params in variants]
@@ -0,0 +1,126 @@
+"""Video frames received from OKON (GET_VIDEO_BYTES, GET_VIDEO).
+
+The receive thread only copies frame data into a fixed ring of buffers and never waits
+for consumers; frames are decoded into numpy arrays when they are read, so frames
+superseded before being read are never decoded. Any number of threads may read a stream.
+
+    video = VideoStream(oc, width=640, height=480)
+    oc.simulation.poll_plan.set_interval(PacketType.GET_VIDEO_BYTES, 0.1)  # or send requests manually
+    frame = video.wait_frame(timeout=1.0)
+"""
+import binascii
+import math
+import time
+from threading import Condition, Lock
+
+import numpy as np
+
+from okon_client import PacketType
+from okon_metrics import RollingStats
+
+try:
+    import cv2
+except ImportError:  # optional, needed only for encoded (JPEG/PNG) frames
+    cv2 = None
+
+
+class Frame:
+    __slots__ = ("seq", "timestamp", "image")
+
+    def __init__(self, seq: int, timestamp: float, image: np.ndarray) -> None:
+        self.seq = seq  # sequence number of the frame (1 for the first received frame)
+        self.timestamp = timestamp  # monotonic time of receiving the frame
+        self.image = image  # height x width x channels uint8 array owned by the frame
+
+
+class VideoStream:
+    """Latest-frame-wins video stream.
+
+    Raw frames of width * height * channels bytes are copied straight into the image,
+    other frames are decoded with OpenCV (if installed).
+    """
+
+    def __init__(self, okon_client, width: int = 640, height: int = 480, channels: int = 3, slots: int = 3) -> None:
+        self.shape = (height, width, channels)
+        self._slots = [bytearray() for _ in range(slots)]
+        self._slot_lengths = [0] * slots
+        self._slot_seqs = [0] * slots
+        self._slot_timestamps = [0.0] * slots
+        self._seq = 0  # sequence number of the latest frame
+        self._read_seq = 0  # sequence number of the last read frame
+        self._condition = Condition()
+        self._read_lock = Lock()  # held while a reader decodes and publishes the latest frame
+        self._frame = None  # the last read frame
+        self.frame_intervals = RollingStats(100)
+        self.received = 0
+        self.dropped = 0  # frames superseded before being read
+        self.decode_errors = 0
+        okon_client.on_frame(PacketType.GET_VIDEO_BYTES, self._on_frame)
+        okon_client.on_frame(PacketType.GET_VIDEO, self._on_base64_frame)
+
+    def _on_base64_frame(self, data: memoryview) -> None:
+        self._on_frame(binascii.a2b_base64(data))
+
+    def _on_frame(self, data) -> None:
+        now = time.monotonic()
+        seq = self._seq + 1
+        i = seq % len(self._slots)
+        slot = self._slots[i]
+        if len(slot) < len(data):  # replaced, not resized, as a reader may hold a view of it
+            slot = self._slots[i] = bytearray(len(data))
+        self._slot_seqs[i] = 0  # invalidates the slot for readers while it is written
+        slot[: len(data)] = data
+        self._slot_lengths[i] = len(data)
+        self._slot_timestamps[i] = now
+        self._slot_seqs[i] = seq
+        if self._seq > 0:
+            self.frame_intervals.add(now - self._slot_timestamps[self._seq % len(self._slots)])
+            if self._read_seq < self._seq:
+                self.dropped += 1
+        self.received += 1
+        with self._condition:
+            self._seq = seq
+            self._condition.notify_all()
+
+    def latest(self) -> Frame:
+        """Returns the latest frame (None if no frame was received yet), shared by all readers of it"""
+        with self._read_lock:
+            while self._seq > self._read_seq:
+                seq = self._seq
+                i = seq % len(self._slots)
+                timestamp = self._slot_timestamps[i]
+                image = self._decode(i)
+                if self._slot_seqs[i] == seq:  # slot was not overwritten while decoding
+                    self._read_seq = seq
+                    self._frame = Frame(seq, timestamp, image) if image is not None else None
+            return self._frame
+
+    def wait_frame(self, timeout: float = None) -> Frame:
+        """Waits for a frame newer than the last read one, returns None on timeout"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._seq > self._read_seq, timeout):
+                return None
+        return self.latest()
+
+    def _decode(self, i: int) -> np.ndarray:
+        data = memoryview(self._slots[i])[: self._slot_lengths[i]]
+        if len(data) == math.prod(self.shape):
+            return np.frombuffer(data, dtype=np.uint8).reshape(self.shape).copy()
+        if cv2 is not None:
+            image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+            if image is not None:
+                if image.ndim == 2:
+                    image = image[:, :, np.newaxis]
+                self.shape = image.shape
+                return image
+        self.decode_errors += 1
+        return None
+
+    def get_stats(self) -> dict:
+        interval = self.frame_intervals.summary().get("mean")
+        return {
+            "received": self.received,
+            "dropped": self.dropped,
+            "decode_errors": self.decode_errors,
+            "fps": 1 / interval if interval else 0.0,
+        }
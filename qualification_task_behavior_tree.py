@@ -13,26 +13,33 @@ from okon_actions import (
     TryDetectNTimes,
     Wait,
 )
-from okon_client import OkonClient
-
-oc = OkonClient(ip="127.0.0.1", port=44210, sync_interval=0.05, debug=False)
-oc.connect()
-time.sleep(1.0)
-
-
-def create_root():
-    root = py_trees.composites.Selector("Selector")
-
-    sequence_1 = py_trees.composites.Sequence("Sequence 1")
-
-    try_detection_3_times = TryDetectNTimes(name="Try detect gate 3 times", okon=oc.okon, object="gate", n=3)
+from okon_client import Okon, OkonClient
+from okon_runner import TreeRunner
+
+
+def create_root(
+    okon: Okon,
+    max_distance: float = 1.5,
+    rotation_delta: float = 2.0,
+    depth: float = 1.1,
+    depth_delta: float = 0.05,
+    speed: float = 1.0,
+):
+    """Builds the tree, keyword arguments are the tuned parameters (see okon_sweep.py)"""
+    # with memory the running Sequence 2 is resumed, otherwise every retry of the gate detection
+    # in Sequence 1 would interrupt and restart its (non-blocking) Wait
+    root = py_trees.composites.Selector("Selector", memory=True)
+
+    sequence_1 = py_trees.composites.Sequence("Sequence 1", memory=True)
+
+    try_detection_3_times = TryDetectNTimes(name="Try detect gate 3 times", okon=okon, object="gate", n=3)
     check_if_gate_far_enough = IsGateFarEnough(
-        name="Check if gate is further than 1.5 m", okon=oc.okon, max_distance=1.5
+        name=f"Check if gate is further than {max_distance} m", okon=okon, max_distance=max_distance
     )
-    calculate_delta_yaw = CalculateDeltaYaw(name="Calculate delta yaw", okon=oc.okon)
-    set_depth = SetDepth(name="Set Depth to 1.1 m", okon=oc.okon, depth=1.1, delta=0.05)
-    rotate_deltaYaw = RotateDeltaYawAngle(name="Turn deltaYaw angle", okon=oc.okon, delta=2.0)
-    set_velocity = SetVelocity(name="Set stable velocity of 1 m/s on Z axis", okon=oc.okon, z=1.0)
+    calculate_delta_yaw = CalculateDeltaYaw(name="Calculate delta yaw", okon=okon)
+    set_depth = SetDepth(name=f"Set Depth to {depth} m", okon=okon, depth=depth, delta=depth_delta)
+    rotate_deltaYaw = RotateDeltaYawAngle(name="Turn deltaYaw angle", okon=okon, delta=rotation_delta)
+    set_velocity = SetVelocity(name=f"Set stable velocity of {speed} m/s on Z axis", okon=okon, z=speed)
 
     sequence_1.add_children(
         [
@@ -45,11 +52,11 @@ def create_root():
         ]
     )
 
-    sequence_2 = py_trees.composites.Sequence("Sequence 2")
+    sequence_2 = py_trees.composites.Sequence("Sequence 2", memory=True)
 
-    wait_for_2_secs = Wait(name="Wait for 2 seconds", okon=oc.okon, secs=2.0)
-    stop_okon = SetVelocity(name="Stop Okon", okon=oc.okon, z=0.0)
-    wait_for_a_while = Wait(name="Wait for 0.1 seconds", okon=oc.okon, secs=0.1)
+    wait_for_2_secs = Wait(name="Wait for 2 seconds", okon=okon, secs=2.0)
+    stop_okon = SetVelocity(name="Stop Okon", okon=okon, z=0.0)
+    wait_for_a_while = Wait(name="Wait for 0.1 seconds", okon=okon, secs=0.1)
     exit_action = Exit(name="Exit")
 
     sequence_2.add_children([wait_for_2_secs, stop_okon, wait_for_a_while, exit_action])
@@ -60,21 +67,24 @@ def create_root():
 
 
 def main():
+    oc = OkonClient(ip="127.0.0.1", port=44210, sync_interval=0.05, debug=False)
+    oc.connect()
+    time.sleep(1.0)
+
     py_trees.logging.level = py_trees.logging.Level.DEBUG
 
-    root = create_root()
+    root = create_root(oc.okon)
 
     root.setup_with_descendants()
-    for tick in range(200):
-        try:
-            print(f"\n{f'{tick = }':.^30}\n")
-            root.tick_once()
-            print("\n")
-            print(py_trees.display.unicode_tree(root=root, show_status=True))
-            print(py_trees.display.unicode_blackboard())
-            time.sleep(0.1)
-        except KeyboardInterrupt:
-            break
+
+    # ticks on every new sensor/detection update, each tick sees one frozen snapshot of OKON state
+    runner = TreeRunner(root, oc, min_rate=10.0, max_rate=20.0, display_interval=1.0)
+    try:
+        runner.run(duration=120.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(runner.get_stats())
     print("\n")
 
 